@@ -0,0 +1,75 @@
+
+import json
+import os
+
+import numpy
+
+from export import spec_key
+
+# Files of a checkpoint directory.
+CHECKPOINT = 'checkpoint.json'
+CHUNK = 'chunk_%06d.npy'
+
+
+def _write_json(filename, data):
+    # Replace the file only once the new one is complete, so a crash leaves
+    # the previous checkpoint.
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(filename + '.tmp', filename)
+
+
+def checkpoint_chunks(solver, path, chunk_size=10000, resume=False):
+    """ Solve the problem of `solver` in chunks of `chunk_size` samples,
+    see `ODESolver.integrate_chunks`, writing each chunk to the directory
+    `path` followed by a checkpoint of the integrator state. Yields the
+    number of samples done after each chunk.
+
+    With `resume` the solve continues from the checkpoint in `path`, which
+    must be of the same problem, with its chunk size. Since every chunk
+    restarts the integrator from the saved state and step size, the
+    result is the same, bit for bit, as without the interruption.
+    """
+    if solver.cache_key() is None:
+        raise ValueError('checkpointed solves need the default t grid')
+    spec = solver.problem_spec()
+    filename = os.path.join(path, CHECKPOINT)
+    if resume:
+        with open(filename) as f:
+            checkpoint = json.load(f)
+        if checkpoint['key'] != spec_key(spec):
+            raise ValueError('%s is a checkpoint of another problem' % path)
+        chunk_size = checkpoint['chunk_size']
+        begin = checkpoint['next']
+        state = (checkpoint['state'], checkpoint['h0'])
+    else:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        checkpoint = {'key': spec_key(spec), 'spec': spec,
+                      'chunk_size': chunk_size, 'num_rows': len(solver.t),
+                      'next': 0}
+        begin, state = 0, None
+        _write_json(filename, checkpoint)
+    for begin, end, solution, (X, h0) in solver.integrate_chunks(
+            chunk_size, begin, state):
+        numpy.save(os.path.join(path, CHUNK % (begin//chunk_size)),
+                   numpy.column_stack([solver.t[begin:end], solution]))
+        # json writes floats with repr, which reads back exactly.
+        checkpoint.update(next=end, state=[float(x) for x in X], h0=h0)
+        _write_json(filename, checkpoint)
+        yield end
+
+
+def load_checkpoint(path):
+    """ Return the times and the solution saved so far in the checkpoint
+    directory `path`. """
+    with open(os.path.join(path, CHECKPOINT)) as f:
+        checkpoint = json.load(f)
+    num_chunks = -(-checkpoint['next']//checkpoint['chunk_size'])
+    if not num_chunks:
+        return numpy.empty(0), numpy.empty((0, len(checkpoint['spec']['vars'])))
+    data = numpy.concatenate([numpy.load(os.path.join(path, CHUNK % i))
+                              for i in range(num_chunks)])
+    return data[:, 0], data[:, 1:]
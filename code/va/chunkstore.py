@@ -0,0 +1,120 @@
+
+import time
+import zlib
+
+import numpy
+
+# Unsigned integers of the size of each float type, for the delta coding.
+_UINT = {4: numpy.uint32, 8: numpy.uint64}
+
+
+def _encode(column, level):
+    """ Compress one column of floats: the differences of consecutive
+    values' bit patterns, which are small for smooth data, are stored byte
+    plane by byte plane so that the zero high bytes form long runs. """
+    size = column.dtype.itemsize
+    bits = numpy.ascontiguousarray(column).view(_UINT[size])
+    delta = numpy.diff(bits, prepend=bits.dtype.type(0))
+    planes = delta.view(numpy.uint8).reshape(-1, size).T
+    return zlib.compress(numpy.ascontiguousarray(planes).tobytes(), level)
+
+
+def _decode(blob, dtype, num):
+    size = dtype.itemsize
+    planes = numpy.frombuffer(zlib.decompress(blob), dtype=numpy.uint8)
+    delta = numpy.ascontiguousarray(planes.reshape(size, num).T).view(_UINT[size])
+    # Integer sums wrap around exactly as the differences did.
+    return numpy.cumsum(delta[:, 0], dtype=delta.dtype).view(dtype)
+
+
+class CompressedArray(object):
+    """ A read-only 2D float array kept compressed in chunks of
+    `chunk_rows` rows, each column of a chunk on its own.
+
+    Indexing decompresses only the chunks and columns it touches, so a
+    column of a long solution can be read without expanding the others.
+    numpy.asarray gives the whole array. The time spent decoding is added
+    up in `decode_time` and `num_decodes`.
+    """
+
+    def __init__(self, array, chunk_rows=65536, level=1):
+        array = numpy.asarray(array)
+        if array.ndim != 2 or array.dtype.itemsize not in _UINT or \
+                array.dtype.kind != 'f':
+            raise ValueError('only 2D arrays of float32 or float64 are stored')
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.chunk_rows = chunk_rows
+        self._chunks = [[_encode(array[begin:begin+chunk_rows, j], level)
+                         for j in range(array.shape[1])]
+                        for begin in range(0, len(array), chunk_rows)]
+        self.decode_time = 0.0
+        self.num_decodes = 0
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def nbytes(self):
+        """ The size of the array when decompressed. """
+        return self.shape[0]*self.shape[1]*self.dtype.itemsize
+
+    @property
+    def compressed_nbytes(self):
+        return sum(len(blob) for chunk in self._chunks for blob in chunk)
+
+    def _rows(self, chunk):
+        return min(self.chunk_rows, self.shape[0] - chunk*self.chunk_rows)
+
+    def _decode_columns(self, begin, end, columns):
+        """ Decode the rows begin:end of the given columns, as a 2D
+        array. """
+        start = time.perf_counter()
+        first, last = begin//self.chunk_rows, -(-end//self.chunk_rows)
+        out = numpy.empty((max(end - begin, 0), len(columns)), dtype=self.dtype)
+        for chunk in range(first, last):
+            offset = chunk*self.chunk_rows
+            lo, hi = max(begin, offset), min(end, offset + self._rows(chunk))
+            for k, j in enumerate(columns):
+                values = _decode(self._chunks[chunk][j], self.dtype,
+                                 self._rows(chunk))
+                out[lo-begin:hi-begin, k] = values[lo-offset:hi-offset]
+        self.decode_time += time.perf_counter() - start
+        self.num_decodes += 1
+        return out
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError('CompressedArray is 2D')
+        rows, cols = key
+        columns = numpy.arange(self.shape[1])[cols]
+        if isinstance(rows, slice):
+            begin, end, step = rows.indices(self.shape[0])
+            if step > 0:
+                data = self._decode_columns(begin, max(end, begin),
+                                            numpy.atleast_1d(columns))[::step]
+            else:
+                data = self._decode_columns(0, self.shape[0],
+                                            numpy.atleast_1d(columns))[rows]
+        else:
+            indices = numpy.arange(self.shape[0])[rows]
+            if not numpy.size(indices):
+                data = numpy.empty((0, numpy.size(columns)), dtype=self.dtype)
+            else:
+                begin = int(numpy.min(indices))
+                data = self._decode_columns(begin, int(numpy.max(indices)) + 1,
+                                            numpy.atleast_1d(columns))
+                data = data[numpy.asarray(indices) - begin]
+        if numpy.ndim(columns) == 0:
+            data = data[..., 0]
+        return data
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._decode_columns(0, self.shape[0], range(self.shape[1]))
+        return data if dtype is None else data.astype(dtype)
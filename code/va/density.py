@@ -0,0 +1,90 @@
+
+import numpy
+from traits.api import HasTraits, Array, Tuple, Int, Event
+
+
+class DensityRaster(HasTraits):
+    """ A 2D histogram of the points (x, y) of a trajectory, filled a chunk
+    at a time.
+
+    The range covered grows to take in the points of each new chunk, by
+    doubling its extent along an axis and merging pairs of bins, so the
+    memory used is that of the `shape` bins whatever the number of points.
+    """
+    # Number of bins along x and y; both must be even.
+    shape = Tuple(Int(400), Int(400))
+    # counts[j, i] is the number of points in the bin of row y_j and column
+    # x_i, the layout of image data.
+    counts = Array
+    x_range = Tuple
+    y_range = Tuple
+    num_points = Int
+    # Fired after each chunk is added.
+    updated = Event
+
+    def _counts_default(self):
+        if self.shape[0] % 2 or self.shape[1] % 2:
+            raise ValueError('the raster needs an even number of bins')
+        return numpy.zeros(self.shape[::-1], dtype='int64')
+
+    def _shape_changed(self):
+        self.reset()
+
+    def reset(self):
+        self.reset_traits(['counts', 'x_range', 'y_range', 'num_points'])
+
+    def add(self, x, y):
+        """ Count the points (x, y), ignoring those that are not finite. """
+        x = numpy.asarray(x, dtype='float')
+        y = numpy.asarray(y, dtype='float')
+        finite = numpy.isfinite(x) & numpy.isfinite(y)
+        if not finite.all():
+            x, y = x[finite], y[finite]
+        if len(x):
+            self._cover(x, y)
+            nx, ny = self.shape
+            i = self._bins(x, self.x_range, nx)
+            j = self._bins(y, self.y_range, ny)
+            self.counts += numpy.bincount(j*nx + i, minlength=nx*ny).reshape(ny, nx)
+            self.num_points += len(x)
+        self.updated = True
+
+    def _bins(self, values, bounds, num):
+        low, high = bounds
+        bins = ((values - low)*(num/(high - low))).astype('int64')
+        # The upper bound itself falls in the last bin.
+        return numpy.minimum(bins, num - 1)
+
+    def _cover(self, x, y):
+        if not self.x_range:
+            self.x_range = self._initial_range(x)
+            self.y_range = self._initial_range(y)
+            return
+        self._grow(1, 'x_range', x.min(), x.max())
+        self._grow(0, 'y_range', y.min(), y.max())
+
+    def _initial_range(self, values):
+        low, high = values.min(), values.max()
+        # Leave room around the first chunk, which is rarely representative.
+        margin = 0.05*(high - low) or 0.5*max(abs(low), 1.0)
+        return (float(low - margin), float(high + margin))
+
+    def _grow(self, axis, name, low, high):
+        old_low, old_high = getattr(self, name)
+        while low < old_low or high > old_high:
+            width = old_high - old_low
+            merged = numpy.add.reduceat(self.counts,
+                                        numpy.arange(0, self.counts.shape[axis], 2),
+                                        axis=axis)
+            counts = numpy.zeros_like(self.counts)
+            half = self.counts.shape[axis]//2
+            # Extend towards the side of the point furthest outside.
+            if old_low - low > high - old_high:
+                old_low -= width
+                index = slice(half, None)
+            else:
+                old_high += width
+                index = slice(None, half)
+            counts[(slice(None),)*axis + (index,)] = merged
+            self.counts = counts
+        setattr(self, name, (float(old_low), float(old_high)))
@@ -0,0 +1,179 @@
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+from scipy.integrate import odeint
+from traits.api import (HasTraits, Instance, Array, Property, DelegatesTo,
+        cached_property, Enum, Int)
+
+from ode import ODESolver
+
+
+def _euler_step(f, X, t, dt):
+    return X + dt*f(X, t)
+
+def _rk4_step(f, X, t, dt):
+    k1 = f(X, t)
+    k2 = f(X + 0.5*dt*k1, t + 0.5*dt)
+    k3 = f(X + 0.5*dt*k2, t + 0.5*dt)
+    k4 = f(X + dt*k3, t + dt)
+    return X + dt/6.0*(k1 + 2*k2 + 2*k3 + k4)
+
+STEPPERS = {'euler': _euler_step, 'rk4': _rk4_step}
+
+
+def integrate_fixed(ode, states, t, params=None, method='rk4', reduce=None,
+                    chunk_size=256, dtype='float64'):
+    """ Integrate many states for many parameter sets with fixed steps.
+
+    `states` has shape (num_states, num_vars) and `params` maps parameter
+    names of the ode to arrays of length num_params. Every combination is
+    advanced together as one (num_params, num_states, num_vars) array, one
+    step per interval of the grid `t`.
+
+    With `reduce` None the result has shape
+    (num_params, num_states, len(t), num_vars); it is filled in chunks of
+    `chunk_size` time steps and stored as `dtype`, while the steps are
+    always taken in float64. With 'final' only the state at t[-1] and with
+    'mean' only the time average (trapezoidal rule) is kept, each of shape
+    (num_params, num_states, num_vars).
+    """
+    step = STEPPERS[method]
+    t = numpy.asarray(t, dtype='float')
+    states = numpy.atleast_2d(numpy.asarray(states, dtype='float'))
+    params = dict((name, numpy.asarray(value, dtype='float').reshape(-1, 1))
+                  for name, value in (params or {}).items())
+    num_params = max([len(value) for value in params.values()] or [1])
+    f = lambda X, time: ode.eval_batch(X, time, **params)
+
+    X = numpy.repeat(states[numpy.newaxis], num_params, axis=0)
+    if reduce is None:
+        out = numpy.empty((num_params, len(states), len(t), states.shape[1]),
+                          dtype=dtype)
+        buf = numpy.empty((chunk_size,) + X.shape)
+    elif reduce == 'mean':
+        total = numpy.zeros_like(X)
+    elif reduce != 'final':
+        raise ValueError('unknown reduction %r' % reduce)
+
+    for i in range(len(t)):
+        if i > 0:
+            if reduce == 'mean':
+                total += 0.5*(t[i] - t[i-1])*X
+            X = step(f, X, t[i-1], t[i] - t[i-1])
+            if reduce == 'mean':
+                total += 0.5*(t[i] - t[i-1])*X
+        if reduce is None:
+            buf[i % chunk_size] = X
+            if i % chunk_size == chunk_size-1 or i == len(t)-1:
+                start = i - i % chunk_size
+                out[:, :, start:i+1] = numpy.moveaxis(buf[:i-start+1], 0, 2)
+
+    if reduce is None:
+        return out
+    elif reduce == 'mean':
+        return total/(t[-1] - t[0])
+    return X
+
+
+def integrate_threaded(ode, states, t, params=None, workers=0, **kwargs):
+    """ Run `integrate_fixed` with the states split between a pool of
+    `workers` threads (one per cpu if 0).
+
+    NumPy releases the GIL inside its array loops, so the chunks overlap
+    on a machine with several cpus once they are large enough for those
+    loops to outweigh the Python work of each step; nothing is pickled or
+    copied between workers. On a single cpu the split only adds overhead.
+    `benchmark_threaded` measures the speedup on a given machine.
+    """
+    states = numpy.atleast_2d(numpy.asarray(states, dtype='float'))
+    workers = min(workers or os.cpu_count(), len(states))
+    chunks = numpy.array_split(states, workers)
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(
+                lambda chunk: integrate_fixed(ode, chunk, t, params, **kwargs),
+                chunks))
+    return numpy.concatenate(results, axis=1)
+
+
+def benchmark_threaded(ode, states, t, workers=0, repeat=3, **kwargs):
+    """ Return the best times, in seconds over `repeat` runs, of
+    `integrate_fixed` and of `integrate_threaded` with `workers` threads
+    on the same problem. """
+    def best(func, *args, **extra):
+        times = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            func(ode, states, t, *args, **dict(kwargs, **extra))
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return best(integrate_fixed), best(integrate_threaded, workers=workers)
+
+
+class ODEEnsemble(HasTraits):
+    """ Solutions of an ODE from many initial conditions, sampled at the
+    times of a single solver. """
+    solver = Instance(ODESolver)
+    ode = DelegatesTo('solver')
+    t = DelegatesTo('solver')
+    initial_states = Array
+    # 'odeint' solves each state separately, the fixed step methods
+    # advance all of them together.
+    method = Enum('odeint', 'rk4', 'euler')
+    # Solve in this thread or, for the fixed step methods, in a pool of
+    # `workers` threads (0 means one per cpu). odeint holds the GIL while
+    # it calls the ode, so its states are always solved in turn.
+    backend = Enum('serial', 'thread')
+    workers = Int(0)
+    # Shape (num_states, len(t), num_vars), of the solver's storage_dtype.
+    solutions = Property(Array,
+                    depends_on='initial_states, method, backend, workers, '
+                               'solver.t, solver.ode.changed, '
+                               'solver.storage_dtype')
+
+    @cached_property
+    def _get_solutions(self):
+        try:
+            return self.solve()
+        except Exception as e:
+            print(e)
+            self.ode.error = True
+
+    def solve(self):
+        """ Solve the ODE for every initial state. """
+        states = numpy.atleast_2d(numpy.asarray(self.initial_states,
+                                                dtype='float'))
+        dtype = self.solver.storage_dtype
+        if self.method != 'odeint':
+            if self.backend == 'thread':
+                return integrate_threaded(self.ode, states, self.t,
+                                          workers=self.workers,
+                                          method=self.method, dtype=dtype)[0]
+            return integrate_fixed(self.ode, states, self.t,
+                                   method=self.method, dtype=dtype)[0]
+        return numpy.array([odeint(self.ode.eval, state,
+                                   self.t).astype(dtype, copy=False)
+                            for state in states])
+
+    def perturb(self, num, scale=1e-3, seed=None):
+        """ Set the initial states to `num` random perturbations of the
+        solver's initial state. """
+        rng = numpy.random.default_rng(seed)
+        center = numpy.asarray(self.solver.initial_state, dtype='float')
+        self.initial_states = center + scale*rng.standard_normal(
+                                                    (num, len(center)))
+
+
+if __name__ == '__main__':
+    from ode import LorenzEquation
+    solver = ODESolver(ode=LorenzEquation(), initial_state=[10.,50.,50.])
+    ensemble = ODEEnsemble(solver=solver)
+    ensemble.perturb(500, scale=0.1)
+    print(ensemble.solutions.shape)
+    # The speedup of the threaded fixed step solve, on this machine.
+    states = ensemble.initial_states.repeat(4, axis=0)
+    serial, threaded = benchmark_threaded(solver.ode, states, solver.t)
+    print('%d states on %d cpus: serial %.3fs, threaded %.3fs' %
+          (len(states), os.cpu_count(), serial, threaded))
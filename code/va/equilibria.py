@@ -0,0 +1,167 @@
+
+import numpy
+from traits.api import (HasTraits, Str, Array, List, Property,
+        cached_property)
+
+
+def classify(eigenvalues, tol=1e-9):
+    """ Describe the stability of an equilibrium from the eigenvalues of
+    its Jacobian. """
+    re = eigenvalues.real
+    if (re < -tol).all():
+        kind = 'stable'
+    elif (re > tol).all():
+        kind = 'unstable'
+    elif (re < -tol).any() and (re > tol).any() and (abs(re) > tol).all():
+        kind = 'saddle'
+    else:
+        return 'non-hyperbolic'
+    if (abs(eigenvalues.imag) > tol).any():
+        return kind + ' focus'
+    return kind + ' node'
+
+
+class Equilibrium(HasTraits):
+    """ An equilibrium point of an ODE. """
+    state = Array
+    eigenvalues = Array
+    stability = Property(Str, depends_on='eigenvalues')
+
+    @cached_property
+    def _get_stability(self):
+        return classify(self.eigenvalues)
+
+
+class Branch(HasTraits):
+    """ A branch of equilibria as a parameter of the ODE varies. """
+    param = Str
+    values = Array
+    states = Array
+    stability = List(Str)
+
+
+def _newton(ode, X, t, params, tol, max_iter):
+    """ Run Newton iterations for all the states X[..., num_vars] at once.
+    Returns the final states and the norm of f at them. """
+    for i in range(max_iter):
+        F = ode.eval_batch(X, t, **params)
+        J = ode.jacobian_batch(X, t, **params)
+        # pinv copes with the singular Jacobians of some seeds.
+        dX = -numpy.matmul(numpy.linalg.pinv(J), F[..., numpy.newaxis])[..., 0]
+        X = X + dX
+        if not (abs(dX) > tol*numpy.maximum(abs(X), 1.0)).any():
+            break
+    return X, numpy.sqrt((ode.eval_batch(X, t, **params)**2).sum(axis=-1))
+
+
+def find_equilibria(ode, domain=None, num_seeds=1000, t=0.0, tol=1e-10,
+                    max_iter=50, **params):
+    """ Find the equilibria of `ode` by Newton's method started from a grid
+    of at most `num_seeds` points over `domain` (the ode's default domain
+    if not given), or from `num_seeds` random points when the domain has
+    too many dimensions for a grid with two points per axis. Parameters of
+    the ode may be overridden as keywords.
+    Returns a list of Equilibrium, without duplicates, sorted by state. """
+    domain = domain or ode.default_domain()
+    low, high = numpy.array(domain, dtype='float').T
+    per_axis = int(num_seeds**(1.0/len(domain)) + 1e-9)
+    if per_axis >= 2:
+        axes = [numpy.linspace(a, b, per_axis) for a, b in domain]
+        X = numpy.stack(numpy.meshgrid(*axes, indexing='ij'),
+                        axis=-1).reshape(-1, len(domain))
+    else:
+        rng = numpy.random.default_rng(0)
+        X = low + (high - low)*rng.random((num_seeds, len(domain)))
+    X, residual = _newton(ode, X, t, params, tol, max_iter)
+    scale = (high - low).max()
+    X = X[numpy.isfinite(residual) & (residual < 1e-6*scale)]
+
+    roots = []
+    for state in X[numpy.lexsort(X.T[::-1])]:
+        if not roots or not (abs(numpy.array(roots) - state).max(axis=1) <
+                             1e-6*numpy.maximum(abs(state).max(), 1.0)).any():
+            roots.append(state)
+    if not roots:
+        return []
+    eigenvalues = numpy.linalg.eigvals(ode.jacobian_batch(numpy.array(roots),
+                                                          t, **params))
+    return [Equilibrium(state=state, eigenvalues=eig)
+            for state, eig in zip(roots, eigenvalues)]
+
+
+def _correct(F, jacobian, predicted, tangent, tol, max_iter):
+    """ Newton corrector of pseudo-arclength continuation; returns the
+    point on the branch in the hyperplane through `predicted` normal to
+    `tangent`, or None if it does not converge. """
+    y = predicted
+    for j in range(max_iter):
+        residual = numpy.r_[F(y), tangent.dot(y - predicted)]
+        try:
+            dy = numpy.linalg.solve(numpy.vstack([jacobian(y), tangent]),
+                                    -residual)
+        except numpy.linalg.LinAlgError:
+            return None
+        y = y + dy
+        if not numpy.isfinite(y).all():
+            return None
+        if (abs(dy) < tol*numpy.maximum(abs(y), 1.0)).all():
+            return y
+    return None
+
+
+def continue_equilibrium(ode, state, param, stop, step=0.1, max_steps=10000,
+                         t=0.0, tol=1e-10, max_iter=20):
+    """ Follow the equilibrium near `state` as the parameter `param` of
+    the ode goes from its current value towards `stop`, by
+    pseudo-arclength continuation with arclength steps of `step`.
+    A step whose corrector does not converge is retried at half the
+    length; the branch ends where the step would fall below step/1000.
+    Returns a Branch. """
+    num_vars = len(state)
+    value = getattr(ode, param)
+
+    def F(y):
+        return ode.eval_batch(y[:num_vars], t, **{param: y[num_vars]})
+
+    def jacobian(y):
+        Jx = ode.jacobian_batch(y[:num_vars], t, **{param: y[num_vars]})
+        h = 1e-7*max(abs(y[num_vars]), 1.0)
+        Fp = (ode.eval_batch(y[:num_vars], t, **{param: y[num_vars] + h}) -
+              F(y))/h
+        return numpy.column_stack([Jx, Fp])
+
+    y, residual = _newton(ode, numpy.asarray(state, dtype='float'), t,
+                          {param: value}, tol, max_iter)
+    if not residual < 1e-6*max(abs(y).max(), 1.0):
+        raise ValueError('no equilibrium found near %r' % (state,))
+    y = numpy.r_[y, value]
+    tangent = numpy.zeros(num_vars + 1)
+    tangent[num_vars] = numpy.sign(stop - value) or 1.0
+    points = [y]
+    h = step
+    for i in range(max_steps):
+        A = jacobian(y)
+        tangent = numpy.linalg.solve(numpy.vstack([A, tangent]),
+                                     numpy.r_[numpy.zeros(num_vars), 1.0])
+        tangent /= numpy.linalg.norm(tangent)
+        y_new = None
+        while y_new is None and h >= step*1e-3:
+            y_new = _correct(F, jacobian, y + h*tangent, tangent, tol,
+                             max_iter)
+            if y_new is None:
+                h /= 2
+        if y_new is None:
+            break
+        h = min(2*h, step)
+        y = y_new
+        if (y[num_vars] - stop)*(points[0][num_vars] - stop) <= 0:
+            break
+        points.append(y)
+
+    points = numpy.array(points)
+    eigenvalues = numpy.linalg.eigvals(
+            [ode.jacobian_batch(p[:num_vars], t, **{param: p[num_vars]})
+             for p in points])
+    return Branch(param=param, values=points[:, num_vars],
+                  states=points[:, :num_vars],
+                  stability=[classify(eig) for eig in eigenvalues])
@@ -0,0 +1,192 @@
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy
+
+from sde import SDE_STEPPERS
+
+# Name of the metadata entry in exported files.
+METADATA_KEY = 'ode_solver'
+
+# Files of a run directory.
+RUN_DATA = 'data.npy'
+RUN_METADATA = 'metadata.json'
+
+
+def solution_metadata(solver):
+    """ Return a json-serializable description of the ODE and the solver
+    settings which produced a solution. """
+    ode = solver.ode
+    metadata = {'ode': ode.name,
+                'ode_class': type(ode).__name__,
+                'vars': list(ode.vars),
+                'parameters': dict((name, float(getattr(ode, name)))
+                                   for name in ode.parameters),
+                'equations': list(getattr(ode, 'equations', [])),
+                'blocks': [block.trait_get('name', 'size', 'equation', 'boundary')
+                           for block in getattr(ode, 'blocks', [])],
+                'initial_state': [float(x) for x in solver.initial_state],
+                't_low': float(solver.t_low),
+                't_high': float(solver.t_high),
+                't_num': solver.t_num,
+                't_mode': solver.t_mode,
+                't_budget': solver.t_budget,
+                'integrator': solver.integrator}
+    if solver.integrator in SDE_STEPPERS:
+        metadata.update(num_paths=solver.num_paths, seed=solver.seed,
+                        band_percentiles=list(solver.band_percentiles))
+    return metadata
+
+
+def spec_key(spec):
+    """ Return a hash identifying the problem described by `spec`, as
+    returned by `solution_metadata`. """
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def _write_csv(filename, names, chunks, metadata, num_rows):
+    with open(filename, 'w', newline='') as f:
+        f.write('# %s: %s\n' % (METADATA_KEY, json.dumps(metadata)))
+        csv.writer(f).writerow(names)
+        for block in chunks:
+            numpy.savetxt(f, block, delimiter=',', fmt='%.17g')
+
+
+def _write_npz(filename, names, chunks, metadata, num_rows):
+    # The columns are streamed to raw temporary files first, since a zip
+    # archive can only be written one entry at a time.
+    tmpdir = tempfile.mkdtemp()
+    try:
+        columns = [open(os.path.join(tmpdir, '%d.bin' % i), 'wb+')
+                   for i in range(len(names))]
+        for block in chunks:
+            for f, column in zip(columns, block.T):
+                f.write(numpy.ascontiguousarray(column).tobytes())
+        header = {'descr': numpy.lib.format.dtype_to_descr(numpy.dtype('float64')),
+                  'fortran_order': False,
+                  'shape': (num_rows,)}
+        with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, column in zip(names, columns):
+                column.seek(0)
+                with archive.open(name + '.npy', 'w', force_zip64=True) as f:
+                    numpy.lib.format.write_array_header_2_0(f, header)
+                    shutil.copyfileobj(column, f)
+                column.close()
+            with archive.open(METADATA_KEY + '.npy', 'w') as f:
+                numpy.lib.format.write_array(f, numpy.array(json.dumps(metadata)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def _arrow_schema(names, metadata):
+    import pyarrow
+    return pyarrow.schema([(name, pyarrow.float64()) for name in names],
+                          metadata={METADATA_KEY: json.dumps(metadata)})
+
+
+def _arrow_batch(schema, block):
+    import pyarrow
+    return pyarrow.RecordBatch.from_arrays(
+                    [pyarrow.array(column) for column in block.T],
+                    schema=schema)
+
+
+def _write_parquet(filename, names, chunks, metadata, num_rows):
+    import pyarrow
+    import pyarrow.parquet
+    schema = _arrow_schema(names, metadata)
+    with pyarrow.parquet.ParquetWriter(filename, schema) as writer:
+        for block in chunks:
+            # One row group per chunk.
+            writer.write_table(pyarrow.Table.from_batches(
+                                        [_arrow_batch(schema, block)]))
+
+
+def _write_arrow(filename, names, chunks, metadata, num_rows):
+    import pyarrow
+    schema = _arrow_schema(names, metadata)
+    with pyarrow.ipc.new_file(filename, schema) as writer:
+        for block in chunks:
+            writer.write_batch(_arrow_batch(schema, block))
+
+
+def _write_run(path, names, chunks, metadata, num_rows):
+    # A directory with the columns in one Fortran ordered array, so that
+    # every column can be memory mapped as a contiguous view.
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    data = numpy.lib.format.open_memmap(os.path.join(path, RUN_DATA), 'w+',
+                                        dtype='float64',
+                                        shape=(num_rows, len(names)),
+                                        fortran_order=True)
+    row = 0
+    for block in chunks:
+        data[row:row+len(block)] = block
+        row += len(block)
+    data.flush()
+    del data
+    with open(os.path.join(path, RUN_METADATA), 'w') as f:
+        json.dump(metadata, f)
+
+
+WRITERS = {'csv': _write_csv,
+           'npz': _write_npz,
+           'parquet': _write_parquet,
+           'arrow': _write_arrow,
+           'run': _write_run}
+
+EXTENSIONS = {'.csv': 'csv', '.npz': 'npz', '.parquet': 'parquet',
+              '.arrow': 'arrow', '.feather': 'arrow'}
+
+
+def export_solution(solver, filename, format=None, columns=None,
+                    chunk_size=None):
+    """ Write the solution of `solver` to a file.
+
+    `format` is one of 'csv', 'npz', 'parquet', 'arrow' or 'run' and is
+    guessed from the extension if not given. `columns` selects the columns
+    among 'time' and the ode variables (all by default). The 'run' format
+    is a directory which `stored.StoredSolution` can open; it always
+    stores the time as its first column. If `chunk_size` is
+    given the ODE is solved and written `chunk_size` samples at a time, see
+    `ODESolver.solve_chunks`, otherwise the solver's current solution is
+    written.
+
+    The ode parameters and solver settings are stored as file metadata
+    under the key `METADATA_KEY`.
+    """
+    if format is None:
+        format = EXTENSIONS.get(os.path.splitext(filename)[1].lower(),
+                                'run' if os.path.isdir(filename) else None)
+    if format not in WRITERS:
+        raise ValueError('unknown export format for %r' % filename)
+    if chunk_size and solver.t_mode == 'adaptive':
+        raise ValueError('chunked export needs t_mode uniform')
+    names = ['time'] + list(solver.ode.vars)
+    if columns is None:
+        columns = names
+    for name in columns:
+        if name not in names:
+            raise ValueError('unknown column %r' % name)
+    if format == 'run':
+        columns = ['time'] + [name for name in columns if name != 'time']
+    idx = [names.index(name) for name in columns]
+
+    metadata = solution_metadata(solver)
+    if chunk_size:
+        parts = solver.solve_chunks(chunk_size)
+        num_rows = len(solver.t)
+        metadata['chunk_size'] = chunk_size
+    else:
+        parts = [(solver.column('time'), solver.solution)]
+        num_rows = len(solver.solution)
+    chunks = (numpy.column_stack([t, solution])[:, idx]
+              for t, solution in parts)
+    metadata['columns'] = list(columns)
+    WRITERS[format](filename, list(columns), chunks, metadata, num_rows)
@@ -0,0 +1,174 @@
+
+import ast
+
+import numpy
+
+
+class ExpressionError(ValueError):
+    """ Raised for an expression which is invalid or not allowed. """
+
+
+# The functions and constants available to expressions.
+FUNCTIONS = dict((name, getattr(numpy, name)) for name in [
+    'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'arctan2',
+    'sinh', 'cosh', 'tanh', 'arcsinh', 'arccosh', 'arctanh',
+    'exp', 'expm1', 'log', 'log10', 'log2', 'log1p', 'sqrt', 'cbrt',
+    'square', 'abs', 'absolute', 'sign', 'floor', 'ceil', 'hypot', 'power',
+    'fmod', 'minimum', 'maximum', 'where', 'clip'])
+
+CONSTANTS = {'pi': numpy.pi, 'e': numpy.e, 'inf': numpy.inf}
+
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare,
+                  ast.Call, ast.Name, ast.Constant, ast.Load,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+                  ast.Pow, ast.USub, ast.UAdd,
+                  ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+
+def _parse(source):
+    try:
+        return ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError('invalid expression %r: %s' % (source, e.msg))
+
+
+def parse_expression(source, names):
+    """ Parse `source` and check that it only uses arithmetic, comparisons,
+    calls of the whitelisted FUNCTIONS, CONSTANTS, numbers and `names`.
+    Returns the ast.Expression. """
+    tree = _parse(source)
+    _check(tree, source, names)
+    return tree
+
+
+def _check(tree, source, names):
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError('%s is not allowed in %r'
+                                  % (type(node).__name__, source))
+        if isinstance(node, ast.Call):
+            if (not isinstance(node.func, ast.Name) or
+                    node.func.id not in FUNCTIONS or node.keywords):
+                raise ExpressionError('invalid function call in %r' % source)
+        elif isinstance(node, ast.Name):
+            if (node.id not in names and node.id not in CONSTANTS and
+                    node.id not in FUNCTIONS):
+                raise ExpressionError('unknown name %r in %r'
+                                      % (node.id, source))
+        elif isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise ExpressionError('%r is not a number in %r'
+                                      % (node.value, source))
+            # Integer arithmetic is unbounded: 9**9**9 would never finish,
+            # as floats it overflows.
+            try:
+                node.value = float(node.value)
+            except OverflowError:
+                raise ExpressionError('%r is too large in %r'
+                                      % (node.value, source))
+
+
+def names_used(source, names, blocks=()):
+    """ Return the set of `names` used by the expression `source`, or by
+    the block expression `source` of `blocks`, see `compile_stencil`. """
+    if blocks:
+        tree = _StencilTransformer(blocks, source).visit(_parse(source))
+    else:
+        tree = parse_expression(source, names)
+    return set(node.id for node in ast.walk(tree)
+               if isinstance(node, ast.Name) and node.id in names)
+
+
+def stencil_name(block, offset):
+    """ Return the argument name standing for block[i+offset] in the
+    functions of `compile_stencil`. """
+    return '_%s_%s%d' % (block, 'm' if offset < 0 else 'p', abs(offset))
+
+
+class _StencilTransformer(ast.NodeTransformer):
+    """ Replaces the elements block[i+k] of an expression by names. """
+
+    def __init__(self, blocks, source):
+        self.blocks = blocks
+        self.source = source
+        self.used = set()
+
+    def visit_Subscript(self, node):
+        offset = None
+        index = node.slice
+        if isinstance(index, ast.Name) and index.id == 'i':
+            offset = 0
+        elif (isinstance(index, ast.BinOp) and isinstance(index.left, ast.Name)
+                and index.left.id == 'i' and isinstance(index.op, (ast.Add, ast.Sub))
+                and isinstance(index.right, ast.Constant)
+                and type(index.right.value) is int):
+            offset = index.right.value*(1 if isinstance(index.op, ast.Add) else -1)
+        if (offset is None or not isinstance(node.value, ast.Name) or
+                node.value.id not in self.blocks):
+            raise ExpressionError('only block[i+k] subscripts are allowed in %r'
+                                  % self.source)
+        self.used.add((node.value.id, offset))
+        return ast.copy_location(
+                ast.Name(id=stencil_name(node.value.id, offset), ctx=ast.Load()),
+                node)
+
+    def visit_Name(self, node):
+        if node.id in self.blocks or node.id.startswith('_'):
+            raise ExpressionError('%r must be indexed in %r'
+                                  % (node.id, self.source))
+        return node
+
+
+def _check_names(names):
+    for name in names:
+        if not name.isidentifier() or name.startswith('_'):
+            raise ExpressionError('invalid variable name %r' % name)
+    if len(set(names)) != len(names):
+        raise ExpressionError('duplicate variable names')
+
+
+def _compile(trees, names):
+    function = ast.Expression(ast.Lambda(
+            args=ast.arguments(posonlyargs=[],
+                               args=[ast.arg(arg=name) for name in names],
+                               kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=ast.Tuple(elts=[tree.body for tree in trees],
+                           ctx=ast.Load())))
+    ast.fix_missing_locations(function)
+    namespace = dict(FUNCTIONS, **CONSTANTS)
+    namespace['__builtins__'] = {}
+    return eval(compile(function, '<equations>', 'eval'), namespace)
+
+
+def compile_system(expressions, names):
+    """ Compile expressions of the variables `names` into one function.
+
+    The function takes the values of the variables as positional arguments
+    and returns a tuple with the value of each expression. It works on
+    numpy arrays elementwise, and is evaluated without builtins.
+    """
+    names = list(names)
+    _check_names(names)
+    trees = [parse_expression(source, names) for source in expressions]
+    return _compile(trees, names)
+
+
+def compile_stencil(expression, names, blocks):
+    """ Compile the expression of a block of variables.
+
+    Besides the variables `names` the expression may use the index `i`
+    and the elements block[i+k], for integer offsets k, of the `blocks`.
+    Returns a function and the list of (block, k) it uses. The function
+    takes the values of `names`, then the array of indices and then the
+    arrays of the elements block[i+k] in the order of that list, and
+    returns a 1-tuple with the value of the expression.
+    """
+    names = list(names) + ['i']
+    _check_names(names + list(blocks))
+    tree = _parse(expression)
+    transformer = _StencilTransformer(blocks, expression)
+    tree = transformer.visit(tree)
+    used = sorted(transformer.used)
+    stencils = [stencil_name(block, offset) for block, offset in used]
+    _check(tree, expression, names + stencils)
+    return _compile([tree], names + stencils), used
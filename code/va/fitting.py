@@ -0,0 +1,127 @@
+
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy
+from scipy.optimize import least_squares
+from traits.api import HasTraits, Dict, Float, Int, List, Bool
+
+from sensitivity import forward_sensitivities
+
+
+class FitResult(HasTraits):
+    """ The result of `fit_parameters`. """
+    # The best fitting parameter values and their cost (half the sum of
+    # the squared residuals).
+    values = Dict
+    cost = Float
+    success = Bool
+    # One dict per start with the 'initial' and fitted 'values', 'cost',
+    # 'nfev', total 'time' and the 'history' of (elapsed seconds, cost)
+    # after each evaluation of the residuals.
+    starts = List
+    num_starts = Int
+
+
+class _FitProblem(object):
+    """ The residuals of a fit, computed without an ODESolver.
+
+    Each solve also integrates the sensitivities to the fitted parameters,
+    which give the Jacobian of the residuals; the last solve is cached,
+    since least_squares asks for the residuals and the Jacobian at the
+    same point.
+    """
+
+    def __init__(self, ode, t, data, names, initial_state, observed):
+        self.ode = ode.clone_traits()
+        self.t = t
+        self.data = data
+        self.names = names
+        self.initial_state = initial_state
+        self.observed = observed
+        self.history = []
+        self.start_time = time.perf_counter()
+        self._cache = (None, None)
+
+    def _solve(self, values):
+        key = tuple(values)
+        if self._cache[0] != key:
+            self.ode.trait_set(**dict(zip(self.names, values)))
+            solution, sensitivities = forward_sensitivities(
+                    self.ode, self.initial_state, self.t, self.names)
+            self._cache = (key, (solution, sensitivities))
+        return self._cache[1]
+
+    def residuals(self, values):
+        solution = self._solve(values)[0]
+        residuals = (solution[1:, self.observed] - self.data).ravel()
+        self.history.append((time.perf_counter() - self.start_time,
+                             0.5*residuals.dot(residuals)))
+        return residuals
+
+    def jacobian(self, values):
+        sensitivities = self._solve(values)[1]
+        return sensitivities[1:, self.observed].reshape(-1, len(self.names))
+
+
+def _fit_start(args):
+    ode, t, data, names, initial_state, observed, start, bounds = args
+    problem = _FitProblem(ode, t, data, names, initial_state, observed)
+    result = least_squares(problem.residuals, start, jac=problem.jacobian,
+                           bounds=bounds, x_scale='jac')
+    return {'initial': dict(zip(names, map(float, start))),
+            'values': dict(zip(names, map(float, result.x))),
+            'cost': float(result.cost),
+            'success': result.success,
+            'nfev': result.nfev,
+            'time': time.perf_counter() - problem.start_time,
+            'history': problem.history}
+
+
+def fit_parameters(ode, t, data, names, initial_state, observed=None,
+                   t0=None, bounds=None, num_starts=1, workers=None,
+                   processes=True, seed=None):
+    """ Fit the parameters `names` of `ode` to measured data.
+
+    `data` has one row per time in `t` and one column per variable in
+    `observed` (all the variables by default). The ODE starts from
+    `initial_state` at `t0` (the first time of `t` by default).
+
+    The first start is from the ode's current parameter values, the other
+    `num_starts`-1 from random points within `bounds`, a dict of
+    (low, high) per parameter. The starts run in parallel on a pool of
+    `workers` processes (threads if `processes` is False).
+
+    The ode itself is not modified. Returns a FitResult.
+    """
+    t = numpy.asarray(t, dtype='float')
+    t0 = t[0] if t0 is None else t0
+    data = numpy.asarray(data, dtype='float').reshape(len(t), -1)
+    if observed is None:
+        observed = list(range(len(ode.vars)))
+    else:
+        observed = [ode.vars.index(name) for name in observed]
+    bounds = bounds or {}
+    low = [bounds.get(name, (-numpy.inf, numpy.inf))[0] for name in names]
+    high = [bounds.get(name, (-numpy.inf, numpy.inf))[1] for name in names]
+
+    starts = [[getattr(ode, name) for name in names]]
+    if num_starts > 1:
+        if not all(name in bounds for name in names):
+            raise ValueError('bounds are required for multiple starts')
+        rng = numpy.random.default_rng(seed)
+        starts.extend(rng.uniform(low, high, (num_starts-1, len(names))))
+
+    args = [(ode, numpy.r_[t0, t], data, list(names), initial_state,
+             observed, start, (low, high)) for start in starts]
+    if num_starts == 1:
+        results = [_fit_start(args[0])]
+    else:
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with pool(workers) as executor:
+            results = list(executor.map(_fit_start, args))
+
+    best = min(results, key=lambda result: result['cost'])
+    return FitResult(values=best['values'], cost=best['cost'],
+                     success=best['success'], starts=results,
+                     num_starts=len(results))
@@ -1,10 +1,22 @@
 
 import numpy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from functools import wraps
-from scipy.integrate import odeint
+from scipy.integrate import odeint, solve_ivp
+from scipy.sparse import csr_matrix
 from traits.api import (HasTraits, Str, List, Instance, Float, Array, Int, 
-        Property, cached_property, Expression, on_trait_change, Event, Bool)
-from traitsui.api import View, Item, RangeEditor
+        Property, cached_property, on_trait_change, Event, Bool,
+        Enum, Any, Dict, Tuple)
+from traitsui.api import View, Item, RangeEditor, TableEditor, ObjectColumn
+
+from expression import (compile_system, compile_stencil, names_used,
+        ExpressionError)
+from export import solution_metadata, spec_key
+from chunkstore import CompressedArray
+from sde import SDE_STEPPERS, integrate_sde
 
 
 class ODE(HasTraits):
@@ -13,6 +25,9 @@ class ODE(HasTraits):
     name = Str
     num_vars = Int(0)
     vars = List(Str, desc='The names of the variables of X vector')
+    parameters = List(Str, desc='The names of the numeric parameters of f')
+    # The (low, high) range offered for each parameter in the ui.
+    param_ranges = Dict(Str, Tuple(Float, Float))
     changed = Event
     error = Bool(False)
 
@@ -20,35 +35,135 @@ class ODE(HasTraits):
         """ Evaluate the derivative function f(X). """
         raise NotImplementedError
 
+    def eval_batch(self, X, t, **params):
+        """ Evaluate f for a batch of states X[..., num_vars].
+
+        Keyword arguments override the named parameters and may be arrays
+        which broadcast against X[..., 0].
+        """
+        if params:
+            raise NotImplementedError('%s does not support parameter arrays'
+                                      % self.name)
+        return numpy.apply_along_axis(self.eval, -1, X, t)
+
+    def jacobian_batch(self, X, t, **params):
+        """ Evaluate the Jacobian for a batch of states X[..., num_vars],
+        as an array of shape X.shape + (num_vars,), by forward differences
+        unless overridden. """
+        X = numpy.asarray(X, dtype='float')
+        f0 = self.eval_batch(X, t, **params)
+        h = 1e-7*numpy.maximum(abs(X), 1.0)
+        J = numpy.empty(f0.shape + X.shape[-1:])
+        for j in range(X.shape[-1]):
+            dX = X.copy()
+            dX[..., j] += h[..., j]
+            J[..., j] = (self.eval_batch(dX, t, **params) - f0)/h[..., j, numpy.newaxis]
+        return J
+
+    def param_values(self, **overrides):
+        """ Return the values of the parameters, in order, replaced by the
+        given overrides. """
+        unknown = set(overrides) - set(self.parameters)
+        if unknown:
+            raise ValueError('unknown parameters: %s' % ', '.join(sorted(unknown)))
+        return [overrides.get(name, getattr(self, name))
+                for name in self.parameters]
+
+    def jacobian(self, X, t):
+        """ Evaluate the Jacobian matrix df_i/dX_j, by forward differences
+        unless overridden. """
+        X = numpy.array(X, dtype='float')
+        f0 = numpy.asarray(self.eval(X, t), dtype='float')
+        h = 1e-7*numpy.maximum(abs(X), 1.0)
+        J = numpy.empty((len(f0), len(X)))
+        for j in range(len(X)):
+            dX = X.copy()
+            dX[j] += h[j]
+            J[:, j] = (numpy.asarray(self.eval(dX, t)) - f0)/h[j]
+        return J
+
+    def diffusion_batch(self, X, t, **params):
+        """ Evaluate the noise amplitudes g(X) of the stochastic version
+        dX = f(X) dt + g(X) dW of the ODE, where each variable has its own
+        Wiener process, for a batch of states X[..., num_vars]. Zero, no
+        noise, unless overridden. """
+        self.param_values(**params)
+        return numpy.zeros(numpy.shape(X))
+
+    def diffusion_derivative_batch(self, X, t, **params):
+        """ Evaluate dg_i/dX_i for a batch of states, as used by the
+        Milstein scheme; by forward differences unless overridden. """
+        X = numpy.asarray(X, dtype='float')
+        g0 = self.diffusion_batch(X, t, **params)
+        h = 1e-7*numpy.maximum(abs(X), 1.0)
+        dg = numpy.empty_like(g0)
+        for j in range(X.shape[-1]):
+            dX = X.copy()
+            dX[..., j] += h[..., j]
+            dg[..., j] = (self.diffusion_batch(dX, t, **params)[..., j] -
+                          g0[..., j])/h[..., j]
+        return dg
+
+    def jacobian_sparsity(self):
+        """ Return the sparsity pattern of the Jacobian as a sparse
+        (num_vars, num_vars) matrix, or None if it is not known. """
+        return None
+
     def default_domain(self):
         return [(0.0,10.0) for i in range(len(self.vars))]
 
 class EpidemicODE(ODE):
     """ The spread of an epidemic in a population
         $\frac{dy}{dt} = ky(L-y)$
-    where $L$ is the total population
+    where $L$ is the total population.
+    Its stochastic version adds $\sigma y(1 - y/L) dW$, a noisy
+    contact rate.
     """
     name = 'Epidemic ODE'
     num_vars = 1
     vars = ['Epidemic Spread']
+    parameters = ['k', 'L', 'sigma']
     L = Float(2.5e5)
     k = Float(3e-5)
+    sigma = Float(0.0)
 
     def eval(self, y, t):
         return self.k * y * (self.L-y)
 
+    def eval_batch(self, X, t, **params):
+        k, L, sigma = self.param_values(**params)
+        y = X[..., 0]
+        return (k * y * (L-y))[..., numpy.newaxis]
+
+    def jacobian(self, y, t):
+        return numpy.array([[self.k*(self.L - 2*y[0])]])
+
+    def jacobian_batch(self, X, t, **params):
+        k, L, sigma = self.param_values(**params)
+        return (k*(L - 2*X[..., 0]))[..., numpy.newaxis, numpy.newaxis]
+
+    def diffusion_batch(self, X, t, **params):
+        k, L, sigma = self.param_values(**params)
+        y = X[..., 0]
+        return (sigma * y * (1 - y/L))[..., numpy.newaxis]
+
+    def diffusion_derivative_batch(self, X, t, **params):
+        k, L, sigma = self.param_values(**params)
+        return (sigma * (1 - 2*X[..., 0]/L))[..., numpy.newaxis]
+
 
 class LorenzEquation(ODE):
     name = 'Lorenz Equation'
     num_vars = 3
     vars = ['x', 'y', 'z']
+    parameters = ['s', 'r', 'b']
+    param_ranges = {'s': (0.0, 20.0), 'r': (20.0, 36.0), 'b': (0.0, 5.0)}
     s = Float(10)
     r = Float(28)
     b = Float(8./3)
 
-    view = View(Item('s', editor=RangeEditor(low=0.0, high=20.0)),
-                Item('r', editor=RangeEditor(low=20.0, high=36.0)),
-                Item('b', editor=RangeEditor(low=0.0, high=5.0)))
+    view = View(*[Item(name, editor=RangeEditor(low=low, high=high))
+                  for name, (low, high) in param_ranges.items()])
 
     @on_trait_change('s,r,b')
     def _on_params_changed(self):
@@ -60,6 +175,25 @@ class LorenzEquation(ODE):
                              self.r*x - y - x*z,
                              x*y - self.b*z])
 
+    def eval_batch(self, X, t, **params):
+        s, r, b = self.param_values(**params)
+        x, y, z = X[..., 0], X[..., 1], X[..., 2]
+        return numpy.stack([s*(y-x), r*x - y - x*z, x*y - b*z], axis=-1)
+
+    def jacobian(self, X, t):
+        x, y, z = X[0], X[1], X[2]
+        return numpy.array([[-self.s, self.s, 0],
+                            [self.r - z, -1, -x],
+                            [y, x, -self.b]])
+
+    def jacobian_batch(self, X, t, **params):
+        s, r, b = numpy.broadcast_arrays(X[..., 0], *self.param_values(**params))[1:]
+        x, y, z = X[..., 0], X[..., 1], X[..., 2]
+        one = numpy.ones_like(x)
+        return numpy.stack([numpy.stack([-s, s, 0*one], axis=-1),
+                            numpy.stack([r - z, -one, -x], axis=-1),
+                            numpy.stack([y, x, -b], axis=-1)], axis=-2)
+
 def check_error(func):
     @wraps(func)
     def wrapper(self, X, t):
@@ -74,40 +208,165 @@ def check_error(func):
     return wrapper
 
 
-class ODE1D(ODE):
+def _shift(u, offset, boundary):
+    """ Return the elements u[..., j+offset] for all j of a block, with the
+    elements beyond the ends given by `boundary`. """
+    if offset == 0:
+        return u
+    if boundary == 'periodic':
+        return numpy.roll(u, -offset, axis=-1)
+    n = u.shape[-1]
+    idx = numpy.arange(n) + offset
+    if boundary == 'edge':
+        return u[..., numpy.clip(idx, 0, n-1)]
+    inside = (idx >= 0) & (idx < n)
+    shifted = numpy.zeros_like(u)
+    shifted[..., inside] = u[..., idx[inside]]
+    return shifted
+
+
+class StateBlock(HasTraits):
+    """ A block of `size` variables name[0], ..., name[size-1] whose
+    derivatives are given by a single `equation`, evaluated for all the
+    elements at once. It may use the index i, the elements name[i+k] of
+    any block of the same size, the scalar variables and t. """
+    name = Str('u')
+    size = Int(10)
+    equation = Str('u[i-1] - 2*u[i] + u[i+1]')
+    # The value of the elements beyond the ends: zero, the nearest end
+    # element ('edge') or wrapped around ('periodic').
+    boundary = Enum('zero', 'edge', 'periodic')
+
+    def element_names(self):
+        return ['%s[%d]' % (self.name, j) for j in range(self.size)]
+
+
+class ExpressionODE(ODE):
+    """ An ODE whose derivatives are given as expressions of the variables
+    and the time t.
+
+    The first len(equations) `vars` are scalar variables, each with its
+    own equation; the rest are the elements of the `blocks`, in order. """
+    # The compiled expressions, see `expression.compile_system`.
+    rhs = Property(depends_on='vars[], equations[]')
+    blocks = List(Instance(StateBlock))
+    # The compiled block equations, see `expression.compile_stencil`.
+    block_rhs = Property(depends_on='vars[], equations[], blocks[], '
+                                    'blocks.name, blocks.size, '
+                                    'blocks.equation')
+
+    @cached_property
+    def _get_rhs(self):
+        return compile_system(self.equations,
+                              ['t'] + self.vars[:len(self.equations)])
+
+    @cached_property
+    def _get_block_rhs(self):
+        sizes = dict((block.name, block.size) for block in self.blocks)
+        names = ['t'] + self.vars[:len(self.equations)]
+        compiled = []
+        start = len(self.equations)
+        for block in self.blocks:
+            function, used = compile_stencil(block.equation, names, sizes)
+            for name, offset in used:
+                if sizes[name] != block.size:
+                    raise ExpressionError('%s and %s differ in size'
+                                          % (name, block.name))
+            compiled.append((block, start, function, used))
+            start += block.size
+        return compiled
+
+    # ODE1D's `equations` is a property of its `equation`, which notifies
+    # here too.
+    @on_trait_change('equations[], blocks.equation, blocks.boundary')
+    def _on_equations_changed(self):
+        self.changed = True
+
+    def _eval_state(self, X, t):
+        X = numpy.asarray(X)
+        num = len(self.equations)
+        columns = [X[..., j] for j in range(num)]
+        parts = []
+        if num:
+            parts.append(numpy.stack(numpy.broadcast_arrays(
+                    X[..., 0], *self.rhs(t, *columns))[1:], axis=-1))
+        if self.blocks:
+            scalars = [column[..., numpy.newaxis] for column in columns]
+            arrays = dict((block.name, (X[..., start:start+block.size], block))
+                          for block, start, function, used in self.block_rhs)
+            for block, start, function, used in self.block_rhs:
+                shifted = [_shift(arrays[name][0], offset,
+                                  arrays[name][1].boundary)
+                           for name, offset in used]
+                value, = function(t, *scalars, numpy.arange(block.size),
+                                  *shifted)
+                parts.append(numpy.broadcast_to(
+                        value, X.shape[:-1] + (block.size,)))
+        return numpy.concatenate(parts, axis=-1)
+
+    def eval(self, X, t):
+        return self._eval_state(X, t)
+
+    def eval_batch(self, X, t, **params):
+        self.param_values(**params)
+        return self._eval_state(X, t)
+
+    def jacobian_sparsity(self):
+        """ Return the pattern of the variables used by each equation. """
+        rows, cols = [], []
+        scalars = self.vars[:len(self.equations)]
+        index = dict((name, j) for j, name in enumerate(scalars))
+        for i, equation in enumerate(self.equations):
+            used = sorted(index[name] for name in names_used(equation, scalars))
+            rows.extend([i]*len(used))
+            cols.extend(used)
+        starts = dict((block.name, (start, block))
+                      for block, start, function, used in self.block_rhs)
+        for block, start, function, used in self.block_rhs:
+            j = numpy.arange(block.size)
+            for name in names_used(block.equation, scalars, starts):
+                rows.extend(start + j)
+                cols.extend([index[name]]*block.size)
+            for name, offset in used:
+                other_start, other = starts[name]
+                idx = j + offset
+                if other.boundary == 'periodic':
+                    idx %= block.size
+                elif other.boundary == 'edge':
+                    idx = numpy.clip(idx, 0, block.size-1)
+                inside = (idx >= 0) & (idx < block.size)
+                rows.extend(start + j[inside])
+                cols.extend(other_start + idx[inside])
+        n = len(self.vars)
+        return csr_matrix((numpy.ones(len(rows), dtype=bool), (rows, cols)),
+                          shape=(n, n))
+
+class ODE1D(ExpressionODE):
     """ A generic 1D ODE """
     name = '1D ODE'
     num_vars = 1
     vars = List(['x'])
-    equation = Expression('1-x')
+    equation = Str('1-x')
+    equations = Property(List(Str), depends_on='equation')
 
-    def eval(self, X, t):
-        return eval(self.equation_, numpy.__dict__, locals())
+    def _get_equations(self):
+        return [self.equation]
 
-class ODE2D(ODE):
+class ODE2D(ExpressionODE):
     """ A generic 2D ODE """
     name = '2D ODE'
     num_vars = 2
     vars = List(['x', 'y'])
-    equations = List(Expression, value=['-y', 'x'])
-
-    def eval(self, X, t):
-        return numpy.array([eval(self.equations[0], numpy.__dict__, locals()),
-                             eval(self.equation[1], numpy.__dict__, locals())])
+    equations = List(Str, value=['-y', 'x'])
 
-class ODE3D(ODE):
+class ODE3D(ExpressionODE):
     """ A generic 3D ODE """
     name = '3D ODE'
     num_vars = 3
     vars = List(['x', 'y', 'z'])
-    equations = List(Expression, value=['-y', 'x', 'y-x'])
-
-    def eval(self, X, t):
-        return numpy.array([eval(self.equations[0], numpy.__dict__, locals()),
-                             eval(self.equation[1], numpy.__dict__, locals()),
-                             eval(self.equation[2], numpy.__dict__, locals())])
+    equations = List(Str, value=['-y', 'x', 'y-x'])
 
-class GenericODE(ODE):
+class GenericODE(ExpressionODE):
     name = "Generic ODE"
     num_vars = Int(1)
     vars = List(Str)
@@ -117,74 +376,590 @@ class GenericODE(ODE):
     view = View(Item('name'),
                 Item('num_vars', label='Number of variables'),
                 Item('equations'),
+                Item('blocks', editor=TableEditor(
+                        columns=[ObjectColumn(name='name'),
+                                 ObjectColumn(name='size'),
+                                 ObjectColumn(name='equation', width=0.6),
+                                 ObjectColumn(name='boundary')],
+                        row_factory=StateBlock, deletable=True,
+                        auto_size=False)),
                 resizable=True)
 
     @check_error
     def eval(self, X, t):
-        localdict = {'t':t}
-        for i, var in enumerate(self.vars):
-            localdict[var] = X[..., i]
-        return numpy.array([eval(self.equations[i], numpy.__dict__, localdict)
-                            for i in range(self.num_vars)])
+        return super().eval(X, t)
 
-    @on_trait_change('equations[]')
-    def _on_equations_changed(self):
+    @on_trait_change('num_vars')
+    def _on_num_vars_changed(self, new):
+        # The lists may not exist yet, in which case their defaults already
+        # have the new length.
+        num = len(self.equations)
+        scalars = self.vars[:num]
+        self.equations = (self.equations[:new] +
+                          ['x%d'%(i) for i in range(num, new)])
+        self.vars = (scalars[:new] +
+                     ['x%d'%(i) for i in range(len(scalars), new)] +
+                     self._block_vars())
+
+    @on_trait_change('blocks[], blocks.name, blocks.size')
+    def _on_blocks_changed(self):
+        self.vars = self.vars[:len(self.equations)] + self._block_vars()
         self.changed = True
 
-    @on_trait_change('num_vars')
-    def _on_num_vars_changed(self, object, name, old, new):
-        if old > new:
-            self.vars = self.vars[:new]
-            self.equations = self.equations[:new]
-        else:
-            extend = ['x%d'%(i) for i in range(old, new)]
-            self.vars.extend(extend)
-            self.equations.extend(extend)
+    def _block_vars(self):
+        return [name for block in self.blocks for name in block.element_names()]
 
     def _vars_default(self):
-        return ['x%d'%(i) for i in range(self.num_vars)]
+        return ['x%d'%(i) for i in range(self.num_vars)] + self._block_vars()
 
     def _equations_default(self):
         return ['x%d'%(i) for i in range(self.num_vars)]
 
 
+class _PreviewTimeout(Exception):
+    """ Raised from the ode to interrupt a preview past its budget. """
+
+
+def odeint_rows(t, info):
+    """ Return the number of rows of an odeint solution over `t` which hold
+    solution values, from its full_output `info`. """
+    if len(t) < 2 or info['message'] == 'Integration successful.':
+        return len(t)
+    # odeint fills the row of an output time once its steps have passed
+    # it, so the first call which ended (at tcur) short of its output time
+    # is the one which failed. Its row holds the state at tcur, and the
+    # rows and info entries after it are uninitialised.
+    direction = numpy.sign(t[-1] - t[0])
+    short = numpy.flatnonzero((info['tcur'] - t[1:])*direction < 0)
+    return 1 + short[0] if len(short) else len(t) - 1
+
+
+def adaptive_indices(t, solution, num):
+    """ Return the indices of at most `num` samples of a solution, with the
+    end points, placed so that every interval between samples carries an
+    equal share of the arc length and turning of the normalised curve. """
+    scale = numpy.ptp(solution, axis=0)
+    scale[scale == 0] = 1.0
+    dy = numpy.diff(solution, axis=0)/scale
+    dt = numpy.diff(t)/(t[-1] - t[0])
+    weight = numpy.sqrt(dt**2 + (dy**2).sum(axis=1))
+    turn = numpy.sqrt((numpy.diff(dy, axis=0)**2).sum(axis=1))
+    weight[:-1] += 0.5*turn
+    weight[1:] += 0.5*turn
+    cumulative = numpy.r_[0, numpy.cumsum(weight)]
+    idx = numpy.searchsorted(cumulative, numpy.linspace(0, cumulative[-1], num))
+    return numpy.unique(numpy.r_[0, numpy.clip(idx, 0, len(t)-1), len(t)-1])
+
+
 class ODESolver(HasTraits):
     """ A single solution state of the ODE (fixed initial condn.) """
     ode = Instance(ODE)
     initial_state = List
     t = Array
-    solution = Property(Array, depends_on='initial_state, t, ode.changed')
+    solution = Property(Array,
+                        depends_on='initial_state, t, ode.changed, storage_order, '
+                                   't_mode, t_budget, backend, server_url, '
+                                   'sensitivity_params[], refined, integrator, '
+                                   'storage_dtype, compress, num_paths, seed, '
+                                   'band_percentiles[]')
+    # The times at which `solution` is sampled.
+    t_solution = Array
 
     t_low = Float(0)
     t_high = Float(10)
     t_num = Int(1000)
+    # Memory layout of `solution`; 'F' makes each variable's column
+    # contiguous so plots can use it without copying.
+    storage_order = Enum('C', 'F')
+    # The solution is always integrated in float64; float32 storage halves
+    # its memory, which is plenty for plotting. With `compress` it is kept
+    # as a `chunkstore.CompressedArray`, which decompresses the chunks a
+    # slice touches, so `column` only expands one variable.
+    storage_dtype = Enum('float64', 'float32')
+    compress = Bool(False)
+    # In 'adaptive' mode the solution is computed on `t` but only
+    # `t_budget` samples, placed where the solution bends, are kept.
+    t_mode = Enum('uniform', 'adaptive')
+    t_budget = Int(200)
+    # Parameters of the ode for which the sensitivities dX/dp are computed
+    # with the solution, and the result, of shape
+    # (len(t_solution), num_vars, len(sensitivity_params)).
+    sensitivity_params = List(Str)
+    sensitivities = Array
+    # odeint (LSODA) or an implicit method of solve_ivp. These use the
+    # ode's analytic Jacobian if it has one, otherwise finite differences
+    # over the groups of columns allowed by `ODE.jacobian_sparsity`, so a
+    # large banded system costs a few evaluations of f per Jacobian.
+    #
+    # 'euler-maruyama' and 'milstein' instead solve the stochastic version
+    # of the ode, see `ODE.diffusion_batch`, for `num_paths` sample paths
+    # with the noise seeded by `seed` (see `sde.integrate_sde`). The
+    # solution is then the mean of the paths, and `bands` holds the
+    # `band_percentiles` over them, of shape
+    # (len(t_solution), len(band_percentiles), num_vars).
+    integrator = Enum('odeint', 'BDF', 'Radau', 'euler-maruyama', 'milstein')
+    num_paths = Int(1000)
+    seed = Int(0)
+    band_percentiles = List(Float, [5., 25., 50., 75., 95.])
+    bands = Array
+    # Solve in this process or send the problem to a `server.SolveServer`.
+    backend = Enum('local', 'remote')
+    server_url = Str('http://localhost:8765')
+    # Number of solutions kept for reuse (0 disables the cache); results
+    # can also be stored by others, see `prefetch.PrefetchScheduler`.
+    cache_size = Int(0)
+    cache_hits = Int
+    _cache = Instance(OrderedDict, ())
+    _cache_lock = Any
+    # With `progressive` a cheap preview, solved to the tolerance
+    # `preview_rtol` on `preview_t_num` steps, is returned first; the full
+    # solution is computed in a background thread and replaces it, firing
+    # `refined`. Needs the cache and the local backend.
+    # The preview runs on the calling (GUI) thread, so it is cut off after
+    # `preview_budget` seconds, one frame by default, and then only covers
+    # the start of the time span, in whole segments of `PREVIEW_SEGMENT`
+    # steps. The cut is made at the next evaluation of the ode, so a single
+    # evaluation longer than the budget exceeds it.
+    progressive = Bool(False)
+    preview_t_num = Int(200)
+    preview_rtol = Float(1e-3)
+    preview_budget = Float(0.016)
+    refined = Event
+    is_preview = Bool(False)
+    preview_time = Float
+    # Background solves of the full solutions, by cache key.
+    _refining = Dict
+    _refine_executor = Any
+
+    # Diagnostics of the last solve. odeint (LSODA) switches between the
+    # nonstiff Adams and the stiff BDF methods as the problem requires.
+    method = Str(desc='the integration methods used by the last solve')
+    switch_times = List(Float, desc='the times at which the method switched')
+    num_steps = Int
+    num_evals = Int
+    # Eigenvalue estimates of the Jacobian at the initial state.
+    spectral_radius = Float
+    stiffness_ratio = Float
+    # These, with the bands, describe the last solve and are cached with
+    # its solution.
+    DIAGNOSTICS = ['method', 'switch_times', 'num_steps', 'num_evals',
+                   'bands']
+    # Larger systems skip the dense eigenvalue stiffness estimate.
+    STIFFNESS_MAX_VARS = 200
+    # Steps of the preview grid integrated per call of odeint.
+    PREVIEW_SEGMENT = 20
 
     view = View('initial_state',
                 't_low',
                 't_high',
                 't_num',
+                't_mode',
+                Item('t_budget', enabled_when="t_mode == 'adaptive'"),
+                'progressive',
+                'integrator',
+                Item('num_paths', enabled_when="integrator in "
+                                              "('euler-maruyama', 'milstein')"),
+                'storage_dtype',
+                'compress',
                 Item('object.ode.error', style='readonly'),
+                Item('method', style='readonly'),
+                Item('switch_times', style='readonly'),
+                Item('stiffness_ratio', style='readonly'),
                 resizable=True)
 
-    @on_trait_change('ode.num_vars')
-    def _on_num_vars_changed(self, new):
+    @on_trait_change('ode.num_vars, ode.vars')
+    def _on_num_vars_changed(self):
         defaults = self.ode.default_domain()
         self.initial_state = [(d[0]+d[1])/2.0 for d in defaults]
 
     @cached_property
     def _get_solution(self):
         try:
-            return self.solve()
+            self.is_preview = False
+            key = self.cache_key() if self.cache_size else None
+            if key is None or self.sensitivity_params:
+                return self.solve()
+            cached = self.cached_solution(key)
+            if cached is None and self.progressive and self.backend == 'local':
+                from server import ODE_CLASSES
+                if ODE_CLASSES.get(type(self.ode).__name__) is type(self.ode):
+                    return self._preview(key)
+            if cached is None:
+                solution = self.solve()
+                self.store_solution(key, self.t_solution, solution,
+                                    self.trait_get(*self.DIAGNOSTICS))
+                return solution
+            self.cache_hits += 1
+            self.t_solution, solution, diagnostics = cached
+            # Solutions stored by others come without diagnostics.
+            self.reset_traits(self.DIAGNOSTICS)
+            self.trait_set(**diagnostics)
+            self.estimate_stiffness(numpy.array(self.initial_state,
+                                                dtype='float'))
+            self.sensitivities = numpy.empty(solution.shape + (0,))
+            return self._stored(solution)
         except Exception as e:
             print(e)
             self.ode.error = True
 
+    def __cache_lock_default(self):
+        return threading.Lock()
+
+    @on_trait_change('progressive')
+    def _on_progressive_changed(self, new):
+        if new and not self.cache_size:
+            self.cache_size = 1
+
+    def _preview(self, key):
+        """ Return a low accuracy solution on a coarse grid, and start the
+        full solve of the problem with the cache key `key`. """
+        start = time.perf_counter()
+        deadline = start + self.preview_budget
+        eval = self.ode.eval
+
+        def rhs(X, t):
+            if time.perf_counter() > deadline:
+                raise _PreviewTimeout
+            return eval(X, t)
+
+        # odeint keeps nothing of a call it is interrupted in, so the grid is
+        # integrated a few steps at a time and the finished segments kept.
+        t = numpy.linspace(self.t_low, self.t_high, self.preview_t_num+1)
+        rows = [numpy.array(self.initial_state, dtype='float')]
+        h0 = 0.0
+        for begin in range(0, len(t) - 1, self.PREVIEW_SEGMENT):
+            segment = t[begin:begin+self.PREVIEW_SEGMENT+1]
+            try:
+                solution, info = odeint(rhs, rows[-1], segment, h0=h0,
+                                        rtol=self.preview_rtol,
+                                        atol=self.preview_rtol,
+                                        full_output=True)
+            except _PreviewTimeout:
+                break
+            num = odeint_rows(segment, info)
+            rows.extend(solution[1:num])
+            if num < len(segment):
+                break
+            h0 = float(info['hu'][-1])
+        self.preview_time = time.perf_counter() - start
+        solution = numpy.array(rows)
+        t = t[:len(solution)]
+        self.t_solution = t
+        self.reset_traits(self.DIAGNOSTICS)
+        self.sensitivities = numpy.empty(solution.shape + (0,))
+        self.is_preview = True
+        self._refine(key)
+        return self._stored(solution)
+
+    def _refine(self, key):
+        # Only the latest problem is worth solving: the queued solves of
+        # earlier ones are cancelled, outside the lock since that runs
+        # their callbacks.
+        spec = self.problem_spec()
+        future = None
+        with self._cache_lock:
+            stale = [other for other_key, other in self._refining.items()
+                     if other_key != key]
+            if key not in self._refining:
+                if self._refine_executor is None:
+                    self._refine_executor = ThreadPoolExecutor(1)
+                future = self._refine_executor.submit(self._solve_full,
+                                                      key, spec)
+                self._refining[key] = future
+        for other in stale:
+            other.cancel()
+        if future is not None:
+            future.add_done_callback(lambda f: self._on_refine_done(key, f))
+
+    def _solve_full(self, key, spec):
+        from server import solver_from_spec
+        solver = solver_from_spec(spec)
+        solution = solver.solve()
+        self.store_solution(key, solver.t_solution, solution,
+                            solver.trait_get(*self.DIAGNOSTICS))
+        if key == self.cache_key():
+            self.refined = True
+
+    def _on_refine_done(self, key, future):
+        with self._cache_lock:
+            if self._refining.get(key) is future:
+                del self._refining[key]
+        if not future.cancelled() and future.exception() is not None:
+            print(future.exception())
+
+    def wait_refined(self, timeout=None):
+        """ Wait for the background solves of a progressive solver. """
+        with self._cache_lock:
+            futures = list(self._refining.values())
+        wait(futures, timeout)
+
+    def problem_spec(self, **params):
+        """ Describe the problem solved, with some ode parameters replaced
+        if given; see `export.solution_metadata`. """
+        spec = solution_metadata(self)
+        spec['parameters'].update(params)
+        return spec
+
+    def cache_key(self, **params):
+        """ Return the key of the problem solved, with some ode parameters
+        replaced if given, in the solution cache; None if `t` was set
+        directly, as the problem spec only describes the default grid. """
+        t = self._t_default()
+        if len(self.t) != len(t) or not numpy.array_equal(self.t, t):
+            return None
+        spec = self.problem_spec(**params)
+        spec['storage_dtype'] = self.storage_dtype
+        # Parameters reached by different float arithmetic, like slider
+        # positions, should share an entry.
+        spec['parameters'] = dict((name, float('%.12g' % value))
+                                  for name, value in spec['parameters'].items())
+        return spec_key(spec)
+
+    def cached_solution(self, key):
+        """ Return the cached (t_solution, solution, diagnostics) for the
+        problem with the `cache_key` `key`, or None. """
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+    def store_solution(self, key, t, solution, diagnostics=None):
+        """ Cache a solution, with the diagnostics traits of its solve if
+        known; safe to call from any thread. """
+        solution = self._stored(solution)
+        with self._cache_lock:
+            self._cache[key] = (t, solution, diagnostics or {})
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
     def solve(self):
         """ Solve the ODE and return the values of the solution vector at
         specified times t. """
-        return odeint(self.ode.eval,
-                       numpy.array(self.initial_state, dtype='float'),
-                       self.t)
+        if self.backend == 'remote':
+            if self.sensitivity_params:
+                raise ValueError('sensitivities are not computed remotely')
+            from server import solve_remote
+            self.t_solution, solution = solve_remote(self.server_url, self)
+            self.sensitivities = numpy.empty(solution.shape + (0,))
+            # Only the mean of the paths of an SDE comes back.
+            self.bands = numpy.empty((len(solution), 0, solution.shape[1]))
+            return self._stored(solution)
+        initial_state = numpy.array(self.initial_state, dtype='float')
+        self.estimate_stiffness(initial_state)
+        bands = numpy.empty((len(self.t), 0, len(initial_state)))
+        if self.integrator in SDE_STEPPERS:
+            if self.sensitivity_params:
+                raise ValueError('sensitivities are not computed for SDEs')
+            result = integrate_sde(self.ode, initial_state, self.t,
+                                   self.num_paths, self.integrator,
+                                   self.seed, self.band_percentiles)
+            solution, bands = result.mean, result.bands
+            sensitivities = numpy.empty((len(self.t), len(initial_state), 0))
+            self.trait_set(method=self.integrator, switch_times=[],
+                           num_steps=len(self.t) - 1, num_evals=0)
+        elif self.sensitivity_params:
+            from sensitivity import forward_sensitivities
+            solution, sensitivities, info = forward_sensitivities(
+                    self.ode, initial_state, self.t, self.sensitivity_params,
+                    full_output=True)
+            num = self._set_diagnostics(info, self.t)
+            solution[num:] = numpy.nan
+            sensitivities[num:] = numpy.nan
+            self.ode.error = num < len(self.t)
+        else:
+            if self.integrator == 'odeint':
+                solution, info = odeint(self.ode.eval, initial_state, self.t,
+                                        full_output=True)
+                num = self._set_diagnostics(info, self.t)
+                solution[num:] = numpy.nan
+            else:
+                solution, result = self._solve_ivp(initial_state, self.t)
+                num = result.y.shape[1]
+                self.trait_set(method=self.integrator.lower(), switch_times=[],
+                               num_steps=0, num_evals=result.nfev)
+            # Like the plots, the ode shows whether the solve failed.
+            self.ode.error = num < len(self.t)
+            sensitivities = numpy.empty((len(self.t), len(initial_state), 0))
+        if self.t_mode == 'adaptive':
+            idx = adaptive_indices(self.t, solution, self.t_budget)
+            self.t_solution = self.t[idx]
+            solution = solution[idx]
+            sensitivities = sensitivities[idx]
+            bands = bands[idx]
+        else:
+            self.t_solution = self.t
+        self.sensitivities = sensitivities
+        self.bands = bands
+        return self._stored(solution)
+
+    def _stored(self, solution):
+        """ Return `solution` in the `storage_order` and `storage_dtype`,
+        compressed if `compress`. """
+        if isinstance(solution, CompressedArray):
+            if self.compress:
+                return solution
+            solution = numpy.asarray(solution)
+        solution = numpy.asarray(solution, dtype=self.storage_dtype,
+                                 order=self.storage_order)
+        if self.compress:
+            return CompressedArray(solution)
+        return solution
+
+    def storage_report(self):
+        """ Compare the memory used by the solution with that of a float64
+        array, and give the time spent decompressing it so far (by
+        `column`, as the plots read it). """
+        solution = self.solution
+        full = solution.shape[0]*solution.shape[1]*8
+        if isinstance(solution, CompressedArray):
+            stored = solution.compressed_nbytes
+            decode_time, num_decodes = (solution.decode_time,
+                                        solution.num_decodes)
+        else:
+            stored, decode_time, num_decodes = solution.nbytes, 0.0, 0
+        return {'storage_dtype': self.storage_dtype,
+                'compress': self.compress,
+                'float64_bytes': full,
+                'stored_bytes': stored,
+                'saved_bytes': full - stored,
+                'ratio': float(stored)/full if full else 1.0,
+                'decode_time': decode_time,
+                'num_decodes': num_decodes}
+
+    def solve_chunks(self, chunk_size=10000):
+        """ Solve the ODE piecewise over `t`, yielding the times and the
+        solution for at most `chunk_size` samples at a time.
+
+        The integration restarts from the last state of each chunk, so the
+        values differ from `solution` within the integration tolerance.
+        Not available in 'adaptive' mode, which selects the samples from
+        the whole solution.
+        """
+        for begin, end, solution, state in self.integrate_chunks(chunk_size):
+            yield self.t[begin:end], solution
+
+    def integrate_chunks(self, chunk_size=10000, begin=0, state=None,
+                         t=None):
+        """ The generator behind `solve_chunks`, which may also start at
+        the index `begin` of `t` from the `state` yielded with an earlier
+        chunk. Yields the index range of each chunk, its solution and the
+        state to continue from, the last row and the last step size.
+
+        `t` replaces the times of the solver; it only needs a length and
+        slicing, so it may compute the times of each chunk when asked, see
+        `poincare.UniformTimes`.
+        """
+        if self.t_mode == 'adaptive':
+            raise ValueError('chunked solves need t_mode uniform')
+        if self.integrator in SDE_STEPPERS:
+            raise ValueError('chunked solves are not available for SDEs')
+        if t is None:
+            t = self.t
+        if state is None:
+            state = (self.initial_state, 0.0)
+        X, h0 = numpy.array(state[0], dtype='float'), state[1]
+        for begin in range(begin, len(t), chunk_size):
+            end = min(begin + chunk_size, len(t))
+            if begin == 0:
+                solution, h0 = self._integrate(X, t[:end], h0)
+            else:
+                solution, h0 = self._integrate(X, t[begin-1:end], h0)
+                solution = solution[1:]
+            X = solution[-1]
+            solution = numpy.asarray(solution, dtype=self.storage_dtype,
+                                     order=self.storage_order)
+            yield begin, end, solution, (X, h0)
+
+    def solve_checkpointed(self, path, chunk_size=10000):
+        """ Solve the ODE in chunks like `solve_chunks`, saving each chunk
+        and the integrator state to the directory `path` as it goes, so an
+        interrupted solve can `resume`. Returns the times and the
+        solution. """
+        from checkpoint import checkpoint_chunks, load_checkpoint
+        for done in checkpoint_chunks(self, path, chunk_size):
+            pass
+        return load_checkpoint(path)
+
+    def resume(self, path):
+        """ Continue an interrupted `solve_checkpointed` of the same problem
+        from its last checkpoint in `path`. Returns the times and the
+        solution, identical to those of an uninterrupted solve. """
+        from checkpoint import checkpoint_chunks, load_checkpoint
+        for done in checkpoint_chunks(self, path, resume=True):
+            pass
+        return load_checkpoint(path)
+
+    def _integrate(self, initial_state, t, h0=0.0):
+        """ Integrate over `t` starting with the step size `h0` (0 lets the
+        integrator choose); returns the solution and the last step size. """
+        if self.integrator == 'odeint':
+            solution, info = odeint(self.ode.eval, initial_state, t, h0=h0,
+                                    full_output=True)
+            num = odeint_rows(t, info)
+            if num < len(t):
+                solution[num:] = numpy.nan
+                return solution, 0.0
+            return solution, float(info['hu'][-1]) if len(t) > 1 else 0.0
+        # solve_ivp picks its own first step.
+        return self._solve_ivp(initial_state, t)[0], 0.0
+
+    def _solve_ivp(self, initial_state, t):
+        """ Integrate with the implicit `integrator`; returns the solution,
+        with nan past a failure, and the result of solve_ivp. """
+        ode = self.ode
+        kwargs = {}
+        if type(ode).jacobian is not ODE.jacobian:
+            kwargs['jac'] = lambda time, y: ode.jacobian(y, time)
+        elif ode.jacobian_sparsity() is not None:
+            kwargs['jac_sparsity'] = ode.jacobian_sparsity()
+        # The tolerances of odeint.
+        result = solve_ivp(lambda time, y: ode.eval_batch(y.T, time).T,
+                           (t[0], t[-1]), initial_state, method=self.integrator,
+                           t_eval=t, vectorized=True, rtol=1.49012e-8,
+                           atol=1.49012e-8, **kwargs)
+        solution = numpy.full((len(t), len(initial_state)), numpy.nan)
+        solution[:result.y.shape[1]] = result.y.T
+        return solution, result
+
+    def estimate_stiffness(self, X):
+        """ Estimate the stiffness of the ODE at the state `X` from the
+        spectrum of its Jacobian. """
+        if len(X) > self.STIFFNESS_MAX_VARS:
+            self.reset_traits(['spectral_radius', 'stiffness_ratio'])
+            return
+        eigvals = numpy.linalg.eigvals(self.ode.jacobian(X, self.t_low))
+        decay = abs(eigvals.real)
+        decay = decay[decay > 0]
+        self.spectral_radius = abs(eigvals).max()
+        self.stiffness_ratio = (decay.max()/decay.min() if len(decay) else 1.0)
+
+    def _set_diagnostics(self, info, t):
+        """ Set the diagnostics from the info of an odeint solve over `t`;
+        returns the number of rows it solved, see `odeint_rows`. """
+        rows = odeint_rows(t, info)
+        # Entry j of the info is for row j+1; the entry of a failed call
+        # still describes the steps it took.
+        num = min(rows, len(t) - 1)
+        if num == 0:
+            self.reset_traits(self.DIAGNOSTICS)
+            return rows
+        mused = info['mused'][:num]
+        switches = numpy.flatnonzero(numpy.diff(mused)) + 1
+        names = {1: 'adams', 2: 'bdf'}
+        self.method = ' -> '.join(names[m]
+                                  for m in mused[numpy.r_[0, switches]])
+        self.switch_times = list(info['tcur'][switches - 1])
+        self.num_steps = int(info['nst'][num-1])
+        self.num_evals = int(info['nfe'][num-1])
+        return rows
+
+    def column(self, name):
+        """ Return the values of the variable `name` (or the time) as a
+        view of the solution, or decompressed from it with `compress`. """
+        solution = self.solution
+        if name in ['t', 'time']:
+            return self.t_solution
+        return solution[:, self.ode.vars.index(name)]
 
     def _t_default(self):
         return numpy.linspace(self.t_low, self.t_high, self.t_num+1) 
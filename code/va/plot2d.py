@@ -1,12 +1,16 @@
 
+import numpy
 from traits.api import HasTraits, Instance, Str, Property, Array, \
-    on_trait_change, cached_property, List
-from traitsui.api import View, Item, HGroup, EnumEditor
+    on_trait_change, cached_property, List, Either, Enum, Int, Any
+from traitsui.api import View, Item, HGroup, EnumEditor, CheckListEditor
 from enable.api import Component, ComponentEditor
-from chaco.api import Plot, ArrayPlotData
+from chaco.api import Plot, ArrayPlotData, jet
 from chaco.tools.api import TraitsTool, ZoomTool, PanTool
 
 from ode import ODE, ODESolver
+from stored import StoredSolution
+from poincare import PoincareSection
+from density import DensityRaster
 
 
 class ODEPlot(HasTraits):
@@ -22,11 +26,22 @@ class ODEPlot(HasTraits):
     name_list = Property(List(Str), depends_on='ode.vars')
 
     ode = Property(Instance(ODE), depends_on='solver')
-    solver = Instance(ODESolver)
+    solver = Either(Instance(ODESolver), Instance(StoredSolution))
+    # The crossings of a Poincare section, drawn as a scatter over the
+    # solution.
+    section = Instance(PoincareSection)
+    # In 'density' mode the points of the solution are binned into
+    # `raster`, `density_chunk` at a time, and shown as an image of the
+    # number of visits to each bin instead of a line.
+    mode = Enum('line', 'density')
+    raster = Instance(DensityRaster, args=())
+    density_chunk = Int(100000)
+    _density_bounds = Any
     traits_view = View(Item('plot', editor=ComponentEditor(),
                             show_label=False),
                        HGroup(Item('index_name', editor=EnumEditor(name='name_list')),
-                              Item('value_name', editor=EnumEditor(name='name_list'))),
+                              Item('value_name', editor=EnumEditor(name='name_list')),
+                              Item('mode')),
                        width=800, height=700, resizable=True,
                        title="ODE Solution")
 
@@ -44,20 +59,120 @@ class ODEPlot(HasTraits):
             self.plot.x_axis.title = new
         else:
             self.plot.y_axis.title = new
+        self._plot_section(self.plot)
+        self._plot_bands(self.plot)
+        if self.mode == 'density':
+            self.rasterize()
+
+    @on_trait_change('section')
+    def _on_section_changed(self):
+        self._plot_section(self.plot)
+        self.plot.request_redraw()
+
+    def _plot_section(self, plot):
+        if self.section is None:
+            if 'section' in plot.plots:
+                plot.delplot('section')
+            return
+        self.pd.update_data(section_index=self.section.column(self.index_name),
+                            section_value=self.section.column(self.value_name))
+        if 'section' not in plot.plots:
+            plot.plot(('section_index', 'section_value'), name='section',
+                      type='scatter', marker='circle', marker_size=2,
+                      color='red')
+
+    # The percentile bands of the paths of an SDE solver, shaded from the
+    # outermost pair of `band_percentiles` inwards over the time plot.
+    @on_trait_change('solver.bands', dispatch='ui')
+    def _on_bands_changed(self):
+        self._plot_bands(self.plot)
+        self.plot.request_redraw()
+
+    def _plot_bands(self, plot):
+        old = [name for name in plot.plots if name.startswith('band')]
+        if old:
+            plot.delplot(*old)
+        bands = getattr(self.solver, 'bands', None)
+        if (bands is None or not bands.size or
+                self.index_name not in ['t', 'time'] or
+                self.value_name not in self.ode.vars):
+            return
+        t = self.solver.t_solution
+        j = self.ode.vars.index(self.value_name)
+        num = bands.shape[1]
+        for k in range(num//2):
+            name = 'band%d' % k
+            self.pd.update_data(**{
+                name + '_index': numpy.r_[t, t[::-1]],
+                name + '_value': numpy.r_[bands[:, k, j],
+                                          bands[::-1, num-1-k, j]]})
+            plot.plot((name + '_index', name + '_value'), name=name,
+                      type='polygon', face_color=(0.0, 0.0, 1.0, 0.15),
+                      edge_color=(0.0, 0.0, 0.0, 0.0))
+
+    def _on_mode_changed(self, new):
+        self.plot.plots['line'][0].visible = new == 'line'
+        if new == 'density':
+            self.rasterize()
+        elif 'density' in self.plot.plots:
+            self.plot.delplot('density')
+            self._density_bounds = None
+        self.plot.request_redraw()
+
+    def rasterize(self):
+        """ Bin the whole solution into the raster. """
+        self.raster.reset()
+        index = self.solver.column(self.index_name)
+        value = self.solver.column(self.value_name)
+        for begin in range(0, len(index), self.density_chunk):
+            end = begin + self.density_chunk
+            self.raster.add(index[begin:end], value[begin:end])
+
+    def stream_density(self, chunk_size=None):
+        """ Solve the ODE in chunks, see `ODESolver.solve_chunks`, binning
+        each into the raster as it arrives, so the image fills in while
+        no more than a chunk of the solution is held. May be run in a
+        background thread. """
+        vars = self.ode.vars
+        self.raster.reset()
+        for t, solution in self.solver.solve_chunks(chunk_size or
+                                                    self.density_chunk):
+            columns = [t if name in ['t', 'time'] else
+                       solution[:, vars.index(name)]
+                       for name in (self.index_name, self.value_name)]
+            self.raster.add(*columns)
+
+    @on_trait_change('raster.updated', dispatch='ui')
+    def _on_raster_updated(self):
+        raster = self.raster
+        if self.mode != 'density' or not raster.x_range:
+            return
+        # A log scale shows both the rarely and the often visited regions.
+        self.pd.set_data('density', numpy.log1p(raster.counts))
+        bounds = (raster.x_range, raster.y_range)
+        if self._density_bounds != bounds:
+            if 'density' in self.plot.plots:
+                self.plot.delplot('density')
+            self.plot.img_plot('density', name='density', colormap=jet,
+                               xbounds=raster.x_range,
+                               ybounds=raster.y_range)
+            self._density_bounds = bounds
+        self.plot.request_redraw()
 
     def _set_arr(self, name, key='index'):
-        if name in ['t', 'time']:
-            arr = self.solver.t
-        elif name in self.ode.vars:
-            arr = self.solver.solution[:, self.ode.vars.index(name)]
+        if name in ['t', 'time'] or name in self.ode.vars:
+            arr = self.solver.column(name)
         else:
             return
         self.trait_set(**{key+'_arr':arr})
 
-    @on_trait_change('solver.solution')
+    # A progressive solver's full solution arrives from its own thread.
+    @on_trait_change('solver.solution', dispatch='ui')
     def _on_soln_changed(self):
         self._set_arr(self.index_name, 'index')
         self._set_arr(self.value_name, 'value')
+        if self.mode == 'density':
+            self.rasterize()
 
     @on_trait_change('index_arr,value_arr')
     def _on_arr_changed(self, obj, name, old, new):
@@ -72,7 +187,9 @@ class ODEPlot(HasTraits):
         plot.tools.append(PanTool(component=plot))
         plot.x_axis.title = self.index_name
         plot.y_axis.title = self.value_name
-        plot.plot(('index', 'value'))
+        plot.plot(('index', 'value'), name='line')
+        self._plot_section(plot)
+        self._plot_bands(plot)
         return plot
 
     def _index_name_default(self):
@@ -82,6 +199,84 @@ class ODEPlot(HasTraits):
         return self.name_list[-1]
 
 
+class ODEMultiPlot(HasTraits):
+    """ A 2D plot of several ode solution variables against one index.
+
+    The plot data refers to views of the solver's solution columns, so no
+    per-variable copies are made.
+    """
+    plot = Instance(Component)
+    pd = Instance(ArrayPlotData, args=())
+
+    index_name = Str('time')
+    value_names = List(Str)
+
+    name_list = Property(List(Str), depends_on='ode.vars')
+
+    ode = Property(Instance(ODE), depends_on='solver')
+    solver = Either(Instance(ODESolver), Instance(StoredSolution))
+    traits_view = View(Item('plot', editor=ComponentEditor(),
+                            show_label=False),
+                       HGroup(Item('index_name', editor=EnumEditor(name='name_list')),
+                              Item('value_names', style='custom',
+                                   editor=CheckListEditor(name='name_list',
+                                                          cols=4))),
+                       width=800, height=700, resizable=True,
+                       title="ODE Solution")
+
+    def _get_ode(self):
+        return self.solver and self.solver.ode
+
+    @cached_property
+    def _get_name_list(self):
+        return ['time'] + self.ode.vars
+
+    def _get_data(self):
+        data = {'index': self.solver.column(self.index_name)}
+        for name in self.value_names:
+            data[name] = self.solver.column(name)
+        return data
+
+    @on_trait_change('solver.solution', dispatch='ui')
+    def _on_soln_changed(self):
+        # A single data_changed event refreshes all the renderers.
+        self.pd.update_data(self._get_data())
+
+    @on_trait_change('index_name')
+    def _on_index_name_changed(self, new):
+        self.pd.set_data('index', self.solver.column(new))
+        self.plot.x_axis.title = new
+
+    @on_trait_change('value_names[]')
+    def _on_value_names_changed(self):
+        plot = self.plot
+        old = [name for name in plot.plots if name not in self.value_names]
+        if old:
+            plot.delplot(*old)
+            for name in old:
+                self.pd.del_data(name)
+        self.pd.update_data(self._get_data())
+        for name in self.value_names:
+            if name not in plot.plots:
+                plot.plot(('index', name), name=name, color='auto')
+        plot.request_redraw()
+
+    def _plot_default(self):
+        self.pd.update_data(self._get_data())
+        plot = Plot(self.pd)
+        plot.tools.append(TraitsTool(component=plot))
+        plot.tools.append(ZoomTool(component=plot))
+        plot.tools.append(PanTool(component=plot))
+        plot.x_axis.title = self.index_name
+        for name in self.value_names:
+            plot.plot(('index', name), name=name, color='auto')
+        plot.legend.visible = True
+        return plot
+
+    def _value_names_default(self):
+        return list(self.ode.vars)
+
+
 if __name__ == '__main__':
     from ode import EpidemicODE, LorenzEquation, GenericODE
     import numpy
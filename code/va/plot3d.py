@@ -1,11 +1,13 @@
 
-from traits.api import HasTraits, Instance, Str, Property, Array, on_trait_change, cached_property, List, Any
+import numpy
+from traits.api import HasTraits, Instance, Str, Property, Array, on_trait_change, cached_property, List, Any, Tuple, Either
 from traitsui.api import View, Item, HGroup, EnumEditor
-from mayavi import mlab
 from mayavi.core.ui.api import MayaviScene, MlabSceneModel, \
     SceneEditor
 
 from ode import ODE, ODESolver
+from stored import StoredSolution
+from ensemble import ODEEnsemble
 
 
 class ODEPlot3D(HasTraits):
@@ -27,7 +29,7 @@ class ODEPlot3D(HasTraits):
     name_list = Property(List(Str), depends_on='ode.vars')
 
     ode = Property(Instance(ODE), depends_on='solver')
-    solver = Instance(ODESolver)
+    solver = Either(Instance(ODESolver), Instance(StoredSolution))
     traits_view = View(Item('scene', editor=SceneEditor(scene_class=MayaviScene),
                             show_label=False),
                        HGroup(Item('x_name', editor=EnumEditor(name='name_list')),
@@ -54,15 +56,14 @@ class ODEPlot3D(HasTraits):
         self._set_arr(new, name[:-5])
 
     def _set_arr(self, name, key):
-        if name in ['t', 'time']:
-            arr = self.solver.t
-        elif name in self.ode.vars:
-            arr = self.solver.solution[:, self.ode.vars.index(name)]
+        if name in ['t', 'time'] or name in self.ode.vars:
+            arr = self.solver.column(name)
         else:
             return
         self.trait_set(**{key+'_arr':arr})
 
-    @on_trait_change('solver.solution')
+    # A progressive solver's full solution arrives from its own thread.
+    @on_trait_change('solver.solution', dispatch='ui')
     def _on_solution_changed(self):
         if self.s_name == '':
             return
@@ -95,6 +96,91 @@ class ODEPlot3D(HasTraits):
                                         self.s_arr, tube_radius=0.1)
         return plot3d
 
+
+class ODEEnsemblePlot3D(HasTraits):
+    """ A 3D plot of all the solutions of an ensemble.
+
+    The trajectories are packed into a single polydata with one line cell
+    per segment, so the scene holds one actor whatever the ensemble size.
+    """
+    scene = Instance(MlabSceneModel, args=())
+
+    x_name = Str
+    y_name = Str
+    z_name = Str
+    s_name = Str
+
+    colormap = Str('jet')
+
+    src = Any
+    surface = Any
+    # The (num_states, len(t)) shape the line cells were built for.
+    _shape = Tuple
+
+    name_list = Property(List(Str), depends_on='ensemble.ode.vars')
+
+    ensemble = Instance(ODEEnsemble)
+    traits_view = View(Item('scene', editor=SceneEditor(scene_class=MayaviScene),
+                            show_label=False),
+                       HGroup(Item('x_name', editor=EnumEditor(name='name_list')),
+                              Item('y_name', editor=EnumEditor(name='name_list')),
+                              Item('z_name', editor=EnumEditor(name='name_list')),
+                              Item('s_name', editor=EnumEditor(name='name_list'))),
+                       width=800, height=700, resizable=True,
+                       title="ODE Ensemble")
+
+    @cached_property
+    def _get_name_list(self):
+        return ['time'] + list(self.ensemble.ode.vars)
+
+    def _get_arr(self, name):
+        """ Return the values of `name` for all trajectories, end to end. """
+        solutions = self.ensemble.solutions
+        if name in ['t', 'time']:
+            return numpy.tile(self.ensemble.t, len(solutions))
+        return solutions[:, :, self.ensemble.ode.vars.index(name)].ravel()
+
+    def _get_arrs(self):
+        return dict(x=self._get_arr(self.x_name), y=self._get_arr(self.y_name),
+                    z=self._get_arr(self.z_name),
+                    scalars=self._get_arr(self.s_name))
+
+    def _set_lines(self):
+        num, length = self.ensemble.solutions.shape[:2]
+        start = (numpy.arange(num)[:, None]*length +
+                 numpy.arange(length-1)).ravel()
+        self.src.mlab_source.dataset.lines = numpy.column_stack([start,
+                                                                 start+1])
+        self.src.update()
+        self._shape = (num, length)
+
+    @on_trait_change('ensemble.solutions,x_name,y_name,z_name,s_name')
+    def update_plot(self):
+        if self.src is None or self.s_name == '':
+            return
+        arrs = self._get_arrs()
+        if self.ensemble.solutions.shape[:2] == self._shape:
+            self.src.mlab_source.set(**arrs)
+        else:
+            self.src.mlab_source.reset(**arrs)
+            self._set_lines()
+
+    @on_trait_change('scene.activated')
+    def create_pipeline(self):
+        n = len(self.name_list)
+        self.trait_set(x_name=self.name_list[1%n],
+                       y_name=self.name_list[2%n],
+                       z_name=self.name_list[3%n],
+                       s_name=self.name_list[0])
+        pipeline = self.scene.mlab.pipeline
+        arrs = self._get_arrs()
+        self.src = pipeline.scalar_scatter(arrs['x'], arrs['y'], arrs['z'],
+                                           arrs['scalars'],
+                                           figure=self.scene.mayavi_scene)
+        self._set_lines()
+        self.surface = pipeline.surface(pipeline.stripper(self.src),
+                                        colormap=self.colormap, line_width=1)
+
 if __name__ == '__main__':
     from ode import EpidemicODE, LorenzEquation, GenericODE
     import numpy
@@ -0,0 +1,139 @@
+
+import numpy
+from traits.api import HasTraits, Array, Float, Enum, Int, List, Str
+
+
+class UniformTimes(object):
+    """ The times `numpy.linspace(low, high, num+1)`, computed per slice
+    so that a long integration never holds all of them. Only slices are
+    supported. """
+
+    def __init__(self, low, high, num):
+        self.low = low
+        self.high = high
+        self.num = num
+
+    def __len__(self):
+        return self.num + 1
+
+    def __getitem__(self, index):
+        indices = numpy.arange(*index.indices(self.num + 1))
+        t = self.low + (self.high - self.low)/self.num*indices
+        return numpy.where(indices == self.num, self.high, t)
+
+
+class PoincareSection(HasTraits):
+    """ The crossings of a trajectory through the hyperplane
+    normal . X = offset. """
+    vars = List(Str)
+    normal = Array
+    offset = Float
+    # Only count crossings in the direction of the normal ('up'), against
+    # it ('down') or both.
+    direction = Enum('up', 'down', 'both')
+    # One row per crossing, in time order.
+    times = Array
+    points = Array
+    num_steps = Int
+
+    def column(self, name):
+        """ Return the values of the variable `name` (or the time) at the
+        crossings. """
+        if name in ['t', 'time']:
+            return self.times
+        return self.points[:, self.vars.index(name)]
+
+
+def _hermite(X0, X1, F0, F1, dt, s):
+    """ The cubic Hermite interpolant between the states X0 and X1, with
+    derivatives F0 and F1, at the fractions `s` of the steps `dt`. """
+    s = s[:, numpy.newaxis]
+    dt = dt[:, numpy.newaxis]
+    return ((1 + 2*s)*(1 - s)**2*X0 + s*(1 - s)**2*dt*F0 +
+            s**2*(3 - 2*s)*X1 + s**2*(s - 1)*dt*F1)
+
+
+def _crossings(ode, t, X, normal, offset, direction, max_iter=60):
+    """ Locate the crossings of the hyperplane between the consecutive rows
+    of the states X at the times t. Returns their times and states. """
+    g = X.dot(normal) - offset
+    before, after = g[:-1], g[1:]
+    up = (before < 0) & (after >= 0)
+    down = (before > 0) & (after <= 0)
+    crossing = {'up': up, 'down': down, 'both': up | down}[direction]
+    k = numpy.flatnonzero(crossing)
+    if not len(k):
+        return numpy.empty(0), numpy.empty((0, X.shape[1]))
+    X0, X1, dt = X[k], X[k+1], t[k+1] - t[k]
+    F0 = ode.eval_batch(X0, t[k])
+    F1 = ode.eval_batch(X1, t[k+1])
+    g0, g1 = g[k], g[k+1]
+    d0, d1 = dt*F0.dot(normal), dt*F1.dot(normal)
+    # Newton on the cubic through g0 and g1, kept within the bracket [a, b]
+    # where it changes sign, bisecting when a step would leave it.
+    a, b = numpy.zeros(len(k)), numpy.ones(len(k))
+    s = g0/(g0 - g1)
+    for i in range(max_iter):
+        value = ((1 + 2*s)*(1 - s)**2*g0 + s*(1 - s)**2*d0 +
+                 s**2*(3 - 2*s)*g1 + s**2*(s - 1)*d1)
+        slope = (6*s*(s - 1)*(g0 - g1) + (1 - s)*(1 - 3*s)*d0 +
+                 s*(3*s - 2)*d1)
+        same = numpy.sign(value) == numpy.sign(g0)
+        a = numpy.where(same, s, a)
+        b = numpy.where(same, b, s)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            s_new = s - value/slope
+        s_new = numpy.where((s_new > a) & (s_new < b), s_new, 0.5*(a + b))
+        done = (abs(s_new - s) < 1e-14).all()
+        s = s_new
+        if done:
+            break
+    return t[k] + s*dt, _hermite(X0, X1, F0, F1, dt, s)
+
+
+def poincare_section(solver, normal, offset=0.0, direction='up',
+                     t_high=None, num_steps=None, chunk_size=10000):
+    """ Integrate the ODE of `solver` from its initial state at `t_low` to
+    `t_high` in `num_steps` uniform steps (by default those of the
+    solver), keeping only its crossings of the hyperplane
+    normal . X = offset.
+
+    `normal` is a sequence with one coefficient per variable, or a dict of
+    coefficients by variable name, such as {'z': 1}. The integration runs
+    in chunks of `chunk_size` steps, see `ODESolver.integrate_chunks`, and
+    each crossing is located on the cubic Hermite interpolant of its step,
+    so the memory used grows with the number of crossings, not of steps.
+    Returns a PoincareSection.
+    """
+    vars = list(solver.ode.vars)
+    if isinstance(normal, dict):
+        unknown = set(normal) - set(vars)
+        if unknown:
+            raise ValueError('unknown variables: %s' % ', '.join(sorted(unknown)))
+        normal = [normal.get(name, 0.0) for name in vars]
+    normal = numpy.array(normal, dtype='float')
+    if normal.shape != (len(vars),) or not normal.any():
+        raise ValueError('the normal needs one coefficient per variable, '
+                         'not all zero')
+    t_high = solver.t_high if t_high is None else t_high
+    num_steps = solver.t_num if num_steps is None else num_steps
+    t = UniformTimes(solver.t_low, t_high, num_steps)
+    times, points = [], []
+    last = None
+    for begin, end, solution, state in solver.integrate_chunks(
+            chunk_size, t=t):
+        # Join each chunk to the last row of the one before, for the
+        # crossings in the step between them.
+        chunk_t = t[begin:end]
+        if last is not None:
+            chunk_t = numpy.r_[last[0], chunk_t]
+            solution = numpy.vstack([last[1], solution])
+        found = _crossings(solver.ode, chunk_t, solution, normal, offset,
+                           direction)
+        times.append(found[0])
+        points.append(found[1])
+        last = (chunk_t[-1], solution[-1])
+    return PoincareSection(vars=vars, normal=normal, offset=offset,
+                           direction=direction, num_steps=num_steps,
+                           times=numpy.concatenate(times),
+                           points=numpy.concatenate(points))
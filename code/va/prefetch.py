@@ -0,0 +1,112 @@
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy
+from traits.api import HasTraits, Instance, Int, Float, Any, on_trait_change
+
+from ode import ODESolver
+from server import solve_spec
+
+
+class PrefetchScheduler(HasTraits):
+    """ Solves the problems for the parameter values just ahead of the
+    current one in the background, while a parameter is being changed.
+
+    When a parameter of the solver's ode changes, the next `depth` values
+    continuing with the same step, within the parameter's range, are
+    solved on a pool of `workers` threads and stored in the solver's
+    cache. Queued solves which are no longer ahead, because the user
+    reversed or moved another parameter, are cancelled, as are all of
+    them once nothing has changed for `idle_timeout` seconds.
+    """
+    solver = Instance(ODESolver)
+    workers = Int(1)
+    depth = Int(3)
+    idle_timeout = Float(1.0)
+
+    _executor = Any
+    # Queued or running solves, by spec_key.
+    _pending = Any
+    _lock = Any
+    _ode = Any
+    _timer = Any
+
+    def __pending_default(self):
+        return {}
+
+    def __lock_default(self):
+        return threading.Lock()
+
+    @on_trait_change('solver, depth')
+    def _on_depth_changed(self):
+        # Room for the prefetched solutions on both sides of the current one.
+        if self.solver is not None and self.solver.cache_size < 2*(self.depth + 1):
+            self.solver.cache_size = 2*(self.depth + 1)
+
+    @on_trait_change('solver, solver.ode')
+    def _on_ode_changed(self):
+        if self._ode is not None:
+            self._ode.on_trait_change(self._on_param_changed,
+                                      self._ode.parameters, remove=True)
+        self._ode = self.solver and self.solver.ode
+        if self._ode is not None:
+            self._ode.on_trait_change(self._on_param_changed,
+                                      self._ode.parameters)
+
+    def _on_param_changed(self, ode, name, old, new):
+        low, high = ode.param_ranges.get(name, (-numpy.inf, numpy.inf))
+        values = [value for value in new + (new - old)*numpy.arange(1, self.depth+1)
+                  if low <= value <= high and value != new]
+        specs = {}
+        for value in values:
+            key = self.solver.cache_key(**{name: value})
+            if key is not None:
+                specs[key] = self.solver.problem_spec(**{name: value})
+        self._schedule(specs)
+        self._restart_timer()
+
+    def _schedule(self, specs):
+        # Cancelling a future or adding a callback to a finished one calls
+        # `_on_done` in this thread, so neither is done holding the lock.
+        with self._lock:
+            stale = [future for key, future in self._pending.items()
+                     if key not in specs]
+            submitted = []
+            if specs and self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+            for key, spec in specs.items():
+                if key in self._pending or self.solver.cached_solution(key):
+                    continue
+                future = self._executor.submit(solve_spec, spec)
+                self._pending[key] = future
+                submitted.append((key, future))
+        for future in stale:
+            future.cancel()
+        for key, future in submitted:
+            future.add_done_callback(lambda f, key=key: self._on_done(key, f))
+
+    def _on_done(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            t, solution = future.result()
+            self.solver.store_solution(key, t, solution)
+
+    def _restart_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.idle_timeout, self.cancel)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def cancel(self):
+        """ Cancel the solves which have not started yet. """
+        self._schedule({})
+
+    def wait(self):
+        """ Wait for the scheduled solves to finish. """
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures)
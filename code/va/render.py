@@ -0,0 +1,154 @@
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+# Each worker process builds one off-screen pipeline of the kind and size
+# it was started with, on its first task, and redraws it with new data for
+# every image after that.
+_kind = None
+_size = None
+_pipeline = None
+# The columns of the trajectory being animated, sent once per worker.
+_columns = None
+
+
+def _init_worker(kind, size, columns):
+    global _kind, _size, _pipeline, _columns
+    # No window system: Chaco renders through kiva's image backend and
+    # Mayavi through VTK's off-screen render window (which needs VTK built
+    # with OSMesa or EGL on a machine without a display).
+    os.environ.setdefault('ETS_TOOLKIT', 'null')
+    _kind, _size, _columns = kind, size, columns
+    _pipeline = None
+
+
+class _Pipeline3D(object):
+    """ An off-screen Mayavi figure with a single tube, drawn like
+    `plot3d.ODEPlot3D`. """
+
+    def __init__(self, size, x, y, z, s):
+        from mayavi import mlab
+        mlab.options.offscreen = True
+        self.mlab = mlab
+        self.figure = mlab.figure(size=size)
+        self.plot = mlab.plot3d(x, y, z, s, tube_radius=0.1,
+                                figure=self.figure)
+
+    def render(self, filename, x, y, z, s):
+        self.plot.mlab_source.reset(x=x, y=y, z=z, scalars=s)
+        self.mlab.savefig(filename, figure=self.figure)
+
+
+class _Pipeline2D(object):
+    """ An off-screen Chaco plot, drawn like `plot2d.ODEPlot`. """
+
+    def __init__(self, size, index, value):
+        from chaco.api import ArrayPlotData, Plot, PlotGraphicsContext
+        self.size = size
+        self.gc_class = PlotGraphicsContext
+        self.pd = ArrayPlotData(index=index, value=value)
+        self.plot = Plot(self.pd)
+        self.plot.plot(('index', 'value'))
+        self.plot.outer_bounds = list(size)
+
+    def render(self, filename, index, value):
+        self.pd.update_data(index=index, value=value)
+        self.plot.do_layout(force=True)
+        gc = self.gc_class(self.size)
+        gc.render_component(self.plot)
+        gc.save(filename)
+
+
+PIPELINES = {'3d': _Pipeline3D, '2d': _Pipeline2D}
+
+
+def _render(filename, columns):
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = PIPELINES[_kind](_size, *columns)
+    _pipeline.render(filename, *columns)
+    return filename
+
+
+def _render_frame(args):
+    filename, end = args
+    return _render(filename, [column[:end] for column in _columns])
+
+
+def _render_columns(args):
+    filename, columns = args
+    return _render(filename, columns)
+
+
+def _columns_of(solver, names):
+    return [numpy.ascontiguousarray(solver.column(name)) for name in names]
+
+
+def _pool(kind, size, workers, columns=None):
+    # Spawned rather than forked, so no worker inherits a GL context.
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker,
+                               initargs=(kind, size, columns))
+
+
+def _filename(directory, prefix, i):
+    return os.path.join(directory, '%s_%05d.png' % (prefix, i))
+
+
+def _frame_tasks(directory, num_points, num_frames, prefix):
+    """ The filename and the number of points drawn of each frame. """
+    ends = numpy.linspace(2, num_points, num_frames).astype(int)
+    return [(_filename(directory, prefix, i), end)
+            for i, end in enumerate(ends)]
+
+
+def _check(kind, directory):
+    if kind not in PIPELINES:
+        raise ValueError('unknown kind of plot %r' % kind)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+
+def _names(solver, names, kind):
+    if names is None:
+        vars = list(solver.ode.vars)
+        if kind == '3d':
+            names = [vars[i % len(vars)] for i in range(3)] + ['time']
+        else:
+            names = ['time', vars[-1]]
+    return list(names)
+
+
+def render_frames(solver, directory, names=None, kind='3d', num_frames=100,
+                  size=(400, 400), workers=None, prefix='frame'):
+    """ Render an animation of the solution of `solver` growing from its
+    start to its end, as `num_frames` PNG images in `directory`.
+
+    `kind` is '3d' for a tube through the columns `names` (x, y, z and the
+    scalar coloring it; the first three variables and the time by default)
+    or '2d' for a line plot of `names` (index and value; the last variable
+    against the time by default). The frames are rendered off-screen on a
+    pool of `workers` processes, each reusing one pipeline. Returns the
+    filenames in order.
+    """
+    _check(kind, directory)
+    columns = _columns_of(solver, _names(solver, names, kind))
+    tasks = _frame_tasks(directory, len(columns[0]), num_frames, prefix)
+    with _pool(kind, size, workers, columns) as pool:
+        return list(pool.map(_render_frame, tasks))
+
+
+def render_thumbnails(solvers, directory, names=None, kind='3d',
+                      size=(200, 200), workers=None, prefix='thumb'):
+    """ Render one PNG image per solver in `solvers`, for instance one per
+    parameter value of a sweep, in `directory`; see `render_frames`.
+    Returns the filenames in order. """
+    _check(kind, directory)
+    tasks = [(_filename(directory, prefix, i),
+              _columns_of(solver, _names(solver, names, kind)))
+             for i, solver in enumerate(solvers)]
+    with _pool(kind, size, workers) as pool:
+        return list(pool.map(_render_columns, tasks))
@@ -0,0 +1,93 @@
+
+import numpy
+from traits.api import HasTraits, Array, List, Float, Int
+
+# Paths drawing their noise from one random generator. Each block has its
+# own stream, spawned from the seed, so the paths do not depend on how the
+# blocks are shared out between processes or machines.
+BLOCK_SIZE = 1024
+
+
+def _euler_maruyama_step(ode, X, t, dt, dW):
+    return X + dt*ode.eval_batch(X, t) + ode.diffusion_batch(X, t)*dW
+
+def _milstein_step(ode, X, t, dt, dW):
+    g = ode.diffusion_batch(X, t)
+    return (X + dt*ode.eval_batch(X, t) + g*dW +
+            0.5*g*ode.diffusion_derivative_batch(X, t)*(dW**2 - dt))
+
+SDE_STEPPERS = {'euler-maruyama': _euler_maruyama_step,
+                'milstein': _milstein_step}
+
+
+class SDEResult(HasTraits):
+    """ The statistics of the paths of `integrate_sde`. """
+    t = Array
+    percentiles = List(Float)
+    # bands[i, j, k] is the percentiles[j] percentile of variable k over
+    # the paths at t[i].
+    bands = Array
+    # The mean over the paths, of shape (len(t), num_vars).
+    mean = Array
+    # The states of all the paths at t[-1].
+    final = Array
+    # All the paths, of shape (num_paths, len(t), num_vars), when kept.
+    paths = Array
+    num_paths = Int
+
+
+def path_generators(seed, num_paths, block_size=BLOCK_SIZE):
+    """ Return the random generators of the blocks of `block_size` paths
+    out of `num_paths`, spawned from `seed` (an int, a SeedSequence or
+    None for fresh entropy). """
+    if not isinstance(seed, numpy.random.SeedSequence):
+        seed = numpy.random.SeedSequence(seed)
+    num_blocks = -(-num_paths//block_size)
+    return [numpy.random.default_rng(child) for child in seed.spawn(num_blocks)]
+
+
+def integrate_sde(ode, initial_state, t, num_paths=1000, method='milstein',
+                  seed=None, percentiles=(5, 25, 50, 75, 95), substeps=1,
+                  keep_paths=False, block_size=BLOCK_SIZE):
+    """ Integrate `num_paths` sample paths of the stochastic version of
+    `ode`, dX = f(X) dt + g(X) dW with g from `ode.diffusion_batch`, all
+    starting from `initial_state`.
+
+    All the paths are advanced together as one (num_paths, num_vars)
+    array, by 'euler-maruyama' or 'milstein' steps, `substeps` per
+    interval of the grid `t`. The noise of each block of `block_size` paths
+    comes from its own generator, see `path_generators`, so a run is
+    reproducible from `seed`.
+
+    The `percentiles` over the paths and their mean are taken at each time
+    of `t` as the integration goes, so only the current states are held
+    unless `keep_paths`. Returns an SDEResult.
+    """
+    step = SDE_STEPPERS[method]
+    t = numpy.asarray(t, dtype='float')
+    X = numpy.tile(numpy.asarray(initial_state, dtype='float'),
+                   (num_paths, 1))
+    num_vars = X.shape[1]
+    generators = path_generators(seed, num_paths, block_size)
+    sizes = [min(block_size, num_paths - i*block_size)
+             for i in range(len(generators))]
+    bands = numpy.empty((len(t), len(percentiles), num_vars))
+    mean = numpy.empty((len(t), num_vars))
+    paths = numpy.empty((num_paths, len(t), num_vars)) if keep_paths else None
+
+    for i in range(len(t)):
+        if i > 0:
+            dt = (t[i] - t[i-1])/substeps
+            for j in range(substeps):
+                dW = numpy.sqrt(dt)*numpy.concatenate(
+                        [rng.standard_normal((size, num_vars))
+                         for rng, size in zip(generators, sizes)])
+                X = step(ode, X, t[i-1] + j*dt, dt, dW)
+        bands[i] = numpy.percentile(X, percentiles, axis=0)
+        mean[i] = X.mean(axis=0)
+        if keep_paths:
+            paths[:, i] = X
+
+    return SDEResult(t=t, percentiles=list(map(float, percentiles)),
+                     bands=bands, mean=mean, final=X, num_paths=num_paths,
+                     paths=paths if keep_paths else numpy.empty((0,)))
@@ -0,0 +1,43 @@
+
+import numpy
+from scipy.integrate import odeint
+
+
+def forward_sensitivities(ode, initial_state, t, params, full_output=False):
+    """ Solve the ODE together with the sensitivities dX/dp of the solution
+    to the ode parameters named in `params`.
+
+    The sensitivities S obey dS/dt = J S + df/dp with S(0) = 0, and are
+    integrated in the same odeint run as the solution. J comes from
+    `ode.jacobian` and the derivatives df/dp for all the parameters from
+    one batched evaluation of f.
+
+    Returns the solution, of shape (len(t), num_vars), and the
+    sensitivities, of shape (len(t), num_vars, len(params)), followed by
+    odeint's info dictionary if `full_output` is True.
+    """
+    initial_state = numpy.asarray(initial_state, dtype='float')
+    num_vars, num_params = len(initial_state), len(params)
+    values = numpy.array([getattr(ode, name) for name in params],
+                         dtype='float')
+    h = 1e-7*numpy.where(values != 0, abs(values), 1.0)
+    # Row j of the batch has parameter j shifted by h[j].
+    shifted = dict((name, values[j] + h[j]*(numpy.arange(num_params) == j))
+                   for j, name in enumerate(params))
+
+    def rhs(y, time):
+        X = y[:num_vars]
+        S = y[num_vars:].reshape(num_vars, num_params)
+        f = ode.eval_batch(X, time)
+        df_dp = (ode.eval_batch(numpy.broadcast_to(X, (num_params, num_vars)),
+                                time, **shifted) - f)/h[:, numpy.newaxis]
+        dS = numpy.dot(ode.jacobian(X, time), S) + df_dp.T
+        return numpy.concatenate([f, dS.ravel()])
+
+    y0 = numpy.r_[initial_state, numpy.zeros(num_vars*num_params)]
+    y, info = odeint(rhs, y0, t, full_output=True)
+    solution = y[:, :num_vars]
+    sensitivities = y[:, num_vars:].reshape(len(t), num_vars, num_params)
+    if full_output:
+        return solution, sensitivities, info
+    return solution, sensitivities
@@ -0,0 +1,192 @@
+
+import json
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy
+
+from ode import (ODESolver, LorenzEquation, EpidemicODE, GenericODE, ODE1D,
+        ODE2D, ODE3D, StateBlock)
+from export import solution_metadata, spec_key
+
+# The ODEs which can be solved remotely, by class name.
+ODE_CLASSES = dict((cls.__name__, cls) for cls in [
+    LorenzEquation, EpidemicODE, GenericODE, ODE1D, ODE2D, ODE3D])
+# The largest number of variables of a problem built from a spec.
+MAX_VARS = 10000
+
+
+def solver_from_spec(spec, max_vars=MAX_VARS):
+    """ Create an ODESolver from the description returned by
+    `export.solution_metadata`, with at most `max_vars` variables. """
+    if not len(spec['vars']) <= max_vars:
+        raise ValueError('at most %d variables are allowed' % max_vars)
+    ode = ODE_CLASSES[spec['ode_class']]()
+    unknown = set(spec['parameters']) - set(ode.parameters)
+    if unknown:
+        raise ValueError('unknown parameters: %s' % ', '.join(sorted(unknown)))
+    ode.trait_set(**spec['parameters'])
+    if isinstance(ode, ODE1D):
+        ode.equation = spec['equations'][0]
+    elif isinstance(ode, GenericODE):
+        # Checked before the blocks allocate their variable names.
+        if not sum(int(block['size']) for block in spec.get('blocks', [])) <= max_vars:
+            raise ValueError('at most %d variables are allowed' % max_vars)
+        blocks = [StateBlock(**dict((name, block[name]) for name in
+                                    ['name', 'size', 'equation', 'boundary']))
+                  for block in spec.get('blocks', [])]
+        if (len(spec['equations']) + sum(block.size for block in blocks) !=
+                len(spec['vars'])):
+            raise ValueError('the blocks do not match the variables')
+        ode.trait_set(trait_change_notify=False,
+                      num_vars=len(spec['equations']), vars=spec['vars'],
+                      equations=spec['equations'], blocks=blocks)
+    elif spec['equations']:
+        ode.trait_set(vars=spec['vars'], equations=spec['equations'])
+    solver = ODESolver(ode=ode, integrator=spec.get('integrator', 'odeint'))
+    solver.trait_set(initial_state=spec['initial_state'],
+                     **dict((name, spec[name]) for name in
+                            ['t_low', 't_high', 't_num', 't_mode', 't_budget']))
+    solver.trait_set(**dict((name, spec[name]) for name in
+                            ['num_paths', 'seed', 'band_percentiles']
+                            if name in spec))
+    return solver
+
+
+def solve_spec(spec, max_vars=MAX_VARS):
+    """ Solve the problem described by `spec`; returns the sample times and
+    the solution. """
+    solver = solver_from_spec(spec, max_vars)
+    solution = solver.solve()
+    return solver.t_solution, solution
+
+
+class SolveServer(object):
+    """ Solves problems sent over HTTP on a pool of workers.
+
+    A POST to /solve with a json problem description (see
+    `export.solution_metadata`) returns the sample times and the solution
+    as two arrays in .npy format, one after the other. Identical requests
+    in flight share one solve, and recent results are cached. Problems
+    with more than `max_t_num` time steps (counting each path of an SDE),
+    `max_vars` variables or `max_values` values in their solution (times
+    the paths of an SDE, which are all advanced together) are refused, so
+    no solve or cache entry exceeds that size.
+    """
+
+    def __init__(self, host='localhost', port=8765, workers=None,
+                 cache_size=64, processes=True, max_t_num=10**6,
+                 max_vars=MAX_VARS, max_values=10**8):
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.executor = pool(workers)
+        self.cache_size = cache_size
+        self.max_t_num = max_t_num
+        self.max_vars = max_vars
+        self.max_values = max_values
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _SolveHandler)
+        self.httpd.solve_server = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def submit(self, spec):
+        """ Return a future for the solution of `spec`. """
+        for name in ['t_num', 't_budget']:
+            if not 0 < spec[name] <= self.max_t_num:
+                raise ValueError('%s must be between 1 and %d'
+                                 % (name, self.max_t_num))
+        # The paths of an SDE multiply the work of each step.
+        if not 0 < spec.get('num_paths', 1)*spec['t_num'] <= self.max_t_num:
+            raise ValueError('num_paths*t_num must be between 1 and %d'
+                             % self.max_t_num)
+        num_vars = len(spec['vars'])
+        if not 0 < num_vars <= self.max_vars:
+            raise ValueError('the number of variables must be between 1 and %d'
+                             % self.max_vars)
+        if not (spec.get('num_paths', 1)*(spec['t_num'] + 1)*num_vars <=
+                self.max_values):
+            raise ValueError('the solution may hold at most %d values'
+                             % self.max_values)
+        key = spec_key(spec)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._pending:
+                return self._pending[key]
+            future = self.executor.submit(solve_spec, spec, self.max_vars)
+            self._pending[key] = future
+        # A future which is already done calls back at once, which must
+        # not happen while holding the lock.
+        future.add_done_callback(lambda f: self._on_done(key, f))
+        return future
+
+    def _on_done(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.exception() is None:
+                self._cache[key] = future.result()
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+    def start(self):
+        """ Serve requests in a background thread. """
+        thread = threading.Thread(target=self.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown()
+
+
+class _SolveHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != '/solve':
+            self.send_error(404)
+            return
+        try:
+            spec = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            t, solution = self.server.solve_server.submit(spec).result()
+        except Exception as e:
+            self.send_error(400, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.end_headers()
+        numpy.save(self.wfile, t)
+        numpy.save(self.wfile, solution)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def solve_remote(url, solver, timeout=None):
+    """ Solve the problem of `solver` on the SolveServer at `url`; returns
+    the sample times and the solution. """
+    request = urllib.request.Request(url.rstrip('/') + '/solve',
+                    data=json.dumps(solution_metadata(solver)).encode(),
+                    headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        t = numpy.lib.format.read_array(response)
+        solution = numpy.lib.format.read_array(response)
+    return t, solution
+
+
+if __name__ == '__main__':
+    import sys
+    server = SolveServer(host='', port=int(sys.argv[1]) if sys.argv[1:] else 8765)
+    print('Serving on port %d' % server.httpd.server_address[1])
+    server.httpd.serve_forever()
@@ -0,0 +1,66 @@
+
+import json
+import os
+
+import numpy
+from traits.api import (HasTraits, Str, Dict, Array, Instance, Float,
+        Property, cached_property)
+
+from ode import ODE
+from export import RUN_DATA, RUN_METADATA
+
+
+class StoredODE(ODE):
+    """ The description of an ODE whose solution was read from disk. """
+
+    def eval(self, X, t):
+        raise NotImplementedError('%s is a stored solution and cannot be '
+                                  'evaluated' % self.name)
+
+
+class StoredSolution(HasTraits):
+    """ A solution written by `export.export_solution` in the 'run' format.
+
+    It can be given to the plots in place of an ODESolver. The data is
+    memory mapped, so opening a run only reads its metadata and the pages
+    of the columns actually plotted are loaded on demand.
+    """
+    path = Str
+    metadata = Property(Dict, depends_on='path')
+    ode = Property(Instance(ODE), depends_on='metadata')
+    # All the stored columns, time first, as a read-only memory map.
+    data = Property(Array, depends_on='path')
+    t = Property(Array, depends_on='data')
+    solution = Property(Array, depends_on='data')
+
+    @cached_property
+    def _get_metadata(self):
+        with open(os.path.join(self.path, RUN_METADATA)) as f:
+            return json.load(f)
+
+    @cached_property
+    def _get_ode(self):
+        metadata = self.metadata
+        ode = StoredODE(name=metadata['ode'], vars=metadata['columns'][1:])
+        ode.num_vars = len(ode.vars)
+        for name, value in metadata['parameters'].items():
+            ode.add_trait(name, Float(value))
+        ode.parameters = list(metadata['parameters'])
+        return ode
+
+    @cached_property
+    def _get_data(self):
+        return numpy.load(os.path.join(self.path, RUN_DATA), mmap_mode='r')
+
+    def _get_t(self):
+        return self.data[:, 0]
+
+    def _get_solution(self):
+        return self.data[:, 1:]
+
+    def column(self, name):
+        """ Return the values of the variable `name` (or the time) as a
+        view of the stored data. """
+        if name in ['t', 'time']:
+            return self.t
+        return self.solution[:, self.ode.vars.index(name)]
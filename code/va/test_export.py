@@ -0,0 +1,120 @@
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from ode import LorenzEquation, ODESolver
+from export import export_solution, METADATA_KEY
+from stored import StoredSolution
+from checkpoint import checkpoint_chunks, load_checkpoint
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.solver = ODESolver(ode=LorenzEquation(), t_high=3, t_num=100,
+                                initial_state=[10.,50.,50.])
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def test_solve_chunks(self):
+        parts = list(self.solver.solve_chunks(30))
+        self.assertEqual([len(t) for t, soln in parts], [30, 30, 30, 11])
+        numpy.testing.assert_allclose(numpy.concatenate([soln for t, soln in parts]),
+                                      self.solver.solution, rtol=1e-4, atol=1e-4)
+
+    def test_adaptive_chunks(self):
+        self.solver.t_mode = 'adaptive'
+        self.assertRaises(ValueError, export_solution, self.solver,
+                          self._path('soln.npz'), chunk_size=40)
+
+    def test_checkpoint(self):
+        t, solution = self.solver.solve_checkpointed(self._path('full'), 30)
+        numpy.testing.assert_array_equal(t, self.solver.t)
+        numpy.testing.assert_allclose(solution, self.solver.solution,
+                                      rtol=1e-4, atol=1e-4)
+        # Interrupted after two chunks.
+        chunks = checkpoint_chunks(self.solver, self._path('cut'), 30)
+        self.assertEqual([next(chunks), next(chunks)], [30, 60])
+        chunks.close()
+        self.assertEqual(len(load_checkpoint(self._path('cut'))[1]), 60)
+        self.solver.ode.r = 20.
+        self.assertRaises(ValueError, self.solver.resume, self._path('cut'))
+        self.solver.ode.r = 28.
+        resumed = self.solver.resume(self._path('cut'))[1]
+        numpy.testing.assert_array_equal(resumed, solution)
+
+    def test_csv(self):
+        filename = self._path('soln.csv')
+        export_solution(self.solver, filename, columns=['time', 'z'])
+        data = numpy.loadtxt(filename, delimiter=',', skiprows=2)
+        numpy.testing.assert_array_equal(data[:, 0], self.solver.t)
+        numpy.testing.assert_array_equal(data[:, 1], self.solver.solution[:, 2])
+        with open(filename) as f:
+            line = f.readline()
+        metadata = json.loads(line.split(':', 1)[1])
+        self.assertEqual(metadata['parameters']['r'], 28)
+
+    def test_npz(self):
+        filename = self._path('soln.npz')
+        export_solution(self.solver, filename, chunk_size=40)
+        data = numpy.load(filename)
+        numpy.testing.assert_array_equal(data['time'], self.solver.t)
+        numpy.testing.assert_allclose(data['y'], self.solver.solution[:, 1],
+                                      rtol=1e-4, atol=1e-4)
+        metadata = json.loads(str(data[METADATA_KEY]))
+        self.assertEqual(metadata['vars'], ['x', 'y', 'z'])
+
+    def test_unknown_column(self):
+        self.assertRaises(ValueError, export_solution, self.solver,
+                          self._path('soln.csv'), columns=['w'])
+
+    def test_stored_solution(self):
+        path = self._path('run')
+        export_solution(self.solver, path, format='run', columns=['z', 'x'],
+                        chunk_size=40)
+        stored = StoredSolution(path=path)
+        self.assertEqual(stored.ode.vars, ['z', 'x'])
+        self.assertEqual(stored.ode.param_values(), [10, 28, 8./3])
+        self.assertTrue(isinstance(stored.data, numpy.memmap))
+        x = stored.column('x')
+        self.assertTrue(x.flags.c_contiguous)
+        numpy.testing.assert_allclose(x, self.solver.solution[:, 0],
+                                      rtol=1e-4, atol=1e-4)
+        numpy.testing.assert_array_equal(stored.column('time'), self.solver.t)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet
+        filename = self._path('soln.parquet')
+        export_solution(self.solver, filename, chunk_size=40)
+        parquet = pyarrow.parquet.ParquetFile(filename)
+        self.assertEqual(parquet.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.column_names, ['time', 'x', 'y', 'z'])
+        metadata = json.loads(table.schema.metadata[METADATA_KEY.encode()])
+        self.assertEqual(metadata['initial_state'], [10., 50., 50.])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        filename = self._path('soln.arrow')
+        export_solution(self.solver, filename, columns=['x'])
+        table = pyarrow.ipc.open_file(filename).read_all()
+        numpy.testing.assert_array_equal(table.column('x').to_numpy(),
+                                         self.solver.solution[:, 0])
+
+if __name__ == '__main__':
+    unittest.main()
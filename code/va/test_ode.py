@@ -1,7 +1,21 @@
 
 import unittest
 
-from ode import LorenzEquation, ODESolver
+import numpy
+from scipy.integrate import odeint, solve_ivp
+
+from ode import (ODE, LorenzEquation, EpidemicODE, ODESolver, GenericODE,
+        ODE1D, ODE2D, ODE3D, StateBlock)
+from expression import ExpressionError
+from equilibria import find_equilibria, continue_equilibrium
+from fitting import fit_parameters
+from prefetch import PrefetchScheduler
+from ensemble import (ODEEnsemble, integrate_fixed, integrate_threaded,
+        benchmark_threaded)
+from poincare import poincare_section
+from density import DensityRaster
+from chunkstore import CompressedArray
+from sde import integrate_sde
 
 
 class TestLorenzEquation(unittest.TestCase):
@@ -22,5 +36,495 @@ class TestLorenzEquation(unittest.TestCase):
         self.assertAlmostEqual(soln[1], 46.64090341)
         self.assertAlmostEqual(soln[2], 54.35797299)
 
+    def test_jacobian(self):
+        X = [1., 2., 3.]
+        numpy.testing.assert_allclose(self.ode.jacobian(X, 0.0),
+                                      ODE.jacobian(self.ode, X, 0.0),
+                                      rtol=1e-5, atol=1e-5)
+
+    def test_diagnostics(self):
+        self.solver.solution
+        self.assertTrue(self.solver.method.startswith('adams'))
+        self.assertTrue(self.solver.num_steps > 0)
+        self.assertTrue(self.solver.stiffness_ratio >= 1)
+
+    def test_jacobian_batch(self):
+        X = numpy.array([[1., 2., 3.], [-4., 5., 6.]])
+        numpy.testing.assert_allclose(self.ode.jacobian_batch(X, 0.0, r=[1., 2.]),
+                                      ODE.jacobian_batch(self.ode, X, 0.0, r=[1., 2.]),
+                                      rtol=1e-5, atol=1e-5)
+
+    def test_equilibria(self):
+        roots = find_equilibria(self.ode, [(-20, 20), (-20, 20), (0, 40)])
+        c = numpy.sqrt(8./3*27)
+        numpy.testing.assert_allclose([root.state for root in roots],
+                                      [[-c, -c, 27], [0, 0, 0], [c, c, 27]],
+                                      atol=1e-8)
+        self.assertEqual([root.stability for root in roots],
+                         ['saddle focus', 'saddle node', 'saddle focus'])
+
+    def test_continuation(self):
+        c = numpy.sqrt(8./3*27)
+        branch = continue_equilibrium(self.ode, [c, c, 27], 'r', 10.0,
+                                      step=0.5)
+        self.assertTrue(branch.values[-1] < 10.5)
+        numpy.testing.assert_allclose(branch.states[:, 0],
+                                      numpy.sqrt(8./3*(branch.values - 1)))
+        self.assertEqual(branch.stability[-1], 'stable focus')
+        self.assertEqual(branch.stability[0], 'saddle focus')
+
+    def test_continuation_start(self):
+        self.assertRaises(ValueError, continue_equilibrium, self.ode,
+                          [1., 2., 3.], 'r', 10.0, max_iter=1)
+
+    def test_many_dimensions(self):
+        ode = GenericODE()
+        ode.num_vars = 12
+        ode.equations = ['1 - x%d' % i for i in range(12)]
+        roots = find_equilibria(ode, num_seeds=50)
+        numpy.testing.assert_allclose([root.state for root in roots],
+                                      [numpy.ones(12)])
+
+    def test_poincare(self):
+        self.solver.t_high = 3.0
+        section = poincare_section(self.solver, {'z': 1.0}, 27.0,
+                                   num_steps=3000, chunk_size=700)
+        event = lambda t, X: X[2] - 27.0
+        event.direction = 1
+        reference = solve_ivp(lambda t, X: self.ode.eval(X, t), (0.0, 3.0),
+                              [10., 50., 50.], events=event, rtol=1e-10,
+                              atol=1e-10)
+        numpy.testing.assert_allclose(section.times, reference.t_events[0],
+                                      rtol=1e-6)
+        numpy.testing.assert_allclose(section.points, reference.y_events[0],
+                                      rtol=1e-4)
+        numpy.testing.assert_allclose(section.column('z'), 27.0)
+        both = poincare_section(self.solver, [0, 0, 1], 27.0,
+                                direction='both', num_steps=3000)
+        self.assertTrue(len(both.times) > len(section.times))
+        self.assertRaises(ValueError, poincare_section, self.solver, {'w': 1})
+
+    def test_density(self):
+        self.solver.t_num = 5000
+        raster = DensityRaster(shape=(40, 30))
+        x, z = [], []
+        for t, solution in self.solver.solve_chunks(700):
+            raster.add(solution[:, 0], solution[:, 2])
+            x.append(solution[:, 0])
+            z.append(solution[:, 2])
+        x, z = numpy.concatenate(x), numpy.concatenate(z)
+        self.assertEqual(raster.num_points, len(x))
+        self.assertTrue(raster.x_range[0] <= x.min() and
+                        x.max() <= raster.x_range[1])
+        counts = numpy.histogram2d(z, x, bins=[30, 40],
+                                   range=[raster.y_range, raster.x_range])[0]
+        numpy.testing.assert_array_equal(raster.counts, counts)
+        raster.reset()
+        self.assertEqual(raster.counts.sum(), 0)
+        self.assertEqual(raster.x_range, ())
+
+    def test_storage_dtype(self):
+        solution = self.solver.solution
+        self.solver.storage_dtype = 'float32'
+        self.assertEqual(self.solver.solution.dtype, numpy.float32)
+        numpy.testing.assert_allclose(self.solver.solution, solution,
+                                      rtol=1e-6)
+        self.solver.compress = True
+        self.assertIsInstance(self.solver.solution, CompressedArray)
+        numpy.testing.assert_array_equal(self.solver.column('y'),
+                                         solution[:, 1].astype('float32'))
+        report = self.solver.storage_report()
+        self.assertEqual(report['float64_bytes'], solution.nbytes)
+        self.assertTrue(report['saved_bytes'] > solution.nbytes/2)
+        self.assertEqual(report['num_decodes'], 1)
+
+    def test_compressed_array(self):
+        self.solver.t_num = 2000
+        solution = self.solver.solution
+        compressed = CompressedArray(solution, chunk_rows=300)
+        numpy.testing.assert_array_equal(numpy.asarray(compressed), solution)
+        for key in [(slice(None), 1), (slice(250, 1700, 7), slice(0, 2)),
+                    1234, (1234, 2), (slice(None, None, -3), 0),
+                    ([1, 5, 1900], 1)]:
+            numpy.testing.assert_array_equal(compressed[key], solution[key])
+        self.assertTrue(compressed.compressed_nbytes < solution.nbytes)
+
+    def test_column_storage(self):
+        soln = self.solver.solution
+        self.solver.storage_order = 'F'
+        x = self.solver.column('x')
+        self.assertTrue(x.flags.c_contiguous)
+        self.assertTrue(numpy.may_share_memory(x, self.solver.solution))
+        numpy.testing.assert_array_equal(x, soln[:, 0])
+        numpy.testing.assert_array_equal(self.solver.column('time'),
+                                         self.solver.t)
+
+
+    def test_progressive(self):
+        expected = self.solver.solution
+        solver = ODESolver(ode=self.ode, initial_state=[10.,50.,50.],
+                           progressive=True, preview_budget=10.)
+        self.assertEqual(len(solver.solution), 201)
+        self.assertTrue(solver.is_preview)
+        solver.wait_refined()
+        numpy.testing.assert_array_equal(solver.solution, expected)
+        self.assertFalse(solver.is_preview)
+        numpy.testing.assert_array_equal(solver.column('time'), solver.t)
+        self.assertEqual(solver.method, self.solver.method)
+
+
+class TestPrefetchScheduler(unittest.TestCase):
+    def setUp(self):
+        self.ode = LorenzEquation()
+        self.solver = ODESolver(ode=self.ode, initial_state=[10.,50.,50.])
+        self.prefetch = PrefetchScheduler(depth=2, solver=self.solver)
+
+    def test_cache(self):
+        self.assertEqual(self.solver.cache_size, 6)
+        self.solver.solution
+        self.ode.r = 28.16
+        self.prefetch.wait()
+        self.ode.r = 28.32
+        solution = self.solver.solution
+        self.assertEqual(self.solver.cache_hits, 1)
+        expected = ODESolver(ode=LorenzEquation(r=28.32),
+                             initial_state=[10.,50.,50.]).solution
+        numpy.testing.assert_array_equal(solution, expected)
+        self.prefetch.wait()
+        # The end of the range is not passed.
+        self.ode.r = 36.
+        self.assertEqual(self.prefetch._pending, {})
+
+    def test_cache_key(self):
+        solution = self.solver.solution
+        method = self.solver.method
+        self.solver.t_num = 500
+        self.solver.method = ''
+        self.solver.t_num = 1000
+        numpy.testing.assert_array_equal(self.solver.solution, solution)
+        self.assertEqual(self.solver.cache_hits, 1)
+        self.assertEqual(self.solver.method, method)
+        # A grid set directly is not described by the spec.
+        self.solver.t = numpy.linspace(0, 5, 101)
+        self.assertEqual(len(self.solver.solution), 101)
+        self.assertEqual(self.solver.cache_hits, 1)
+
+    def test_cancel(self):
+        self.prefetch.workers = 1
+        self.ode.r = 29.
+        self.ode.r = 28.
+        pending = list(self.prefetch._pending.values())
+        self.assertTrue(len(pending) <= 3)
+        self.prefetch.cancel()
+        self.prefetch.wait()
+        self.assertEqual(self.prefetch._pending, {})
+
+
+class TestEpidemicODE(unittest.TestCase):
+    def test_stiffness(self):
+        solver = ODESolver(ode=EpidemicODE(), initial_state=[250.],
+                           t_high=1e3)
+        solver.solution
+        self.assertAlmostEqual(solver.spectral_radius, 7.485)
+        self.assertTrue('bdf' in solver.method)
+        self.assertEqual(len(solver.switch_times),
+                         solver.method.count('->'))
+
+    def test_sensitivities(self):
+        ode = EpidemicODE()
+        solver = ODESolver(ode=ode, initial_state=[250.],
+                           sensitivity_params=['k', 'L'])
+        solver.solution
+        sensitivities = solver.sensitivities
+        self.assertEqual(sensitivities.shape, (1001, 1, 2))
+        for j, name, h in [(0, 'k', 1e-9), (1, 'L', 1.)]:
+            value = getattr(ode, name)
+            ode.trait_set(**{name: value + h})
+            upper = odeint(ode.eval, [250.], solver.t)[:, 0]
+            ode.trait_set(**{name: value - h})
+            lower = odeint(ode.eval, [250.], solver.t)[:, 0]
+            ode.trait_set(**{name: value})
+            numpy.testing.assert_allclose(sensitivities[:, 0, j],
+                                          (upper - lower)/(2*h),
+                                          rtol=1e-3, atol=1e-3*abs(upper - lower).max()/h)
+
+    def test_adaptive_grid(self):
+        solver = ODESolver(ode=EpidemicODE(), initial_state=[250.])
+        dense = solver.solution[:, 0]
+        solver.trait_set(t_mode='adaptive', t_budget=50)
+        self.assertTrue(len(solver.column('time')) <= 51)
+        self.assertEqual(len(solver.solution), len(solver.t_solution))
+        t = solver.t
+        adaptive = numpy.interp(t, solver.t_solution, solver.column('Epidemic Spread'))
+        uniform = numpy.interp(t, t[::20], dense[::20])
+        self.assertTrue(abs(adaptive - dense).max() < abs(uniform - dense).max()/3)
+
+    def test_sde(self):
+        ode = EpidemicODE()
+        t = numpy.linspace(0, 2, 201)
+        exact = odeint(ode.eval, [250.], t)
+        for method in ['euler-maruyama', 'milstein']:
+            result = integrate_sde(ode, [250.], t, 10, method, substeps=20)
+            numpy.testing.assert_allclose(result.bands[:, 2], exact,
+                                          rtol=1e-2)
+        ode.sigma = 0.5
+        result = integrate_sde(ode, [250.], t, 1500, seed=1, keep_paths=True,
+                               block_size=500)
+        numpy.testing.assert_allclose(result.bands, numpy.moveaxis(
+                numpy.percentile(result.paths, result.percentiles, axis=0),
+                0, 1))
+        numpy.testing.assert_allclose(result.mean, result.paths.mean(axis=0))
+        self.assertTrue((numpy.diff(result.bands[-1, :, 0]) > 0).all())
+        # The paths of each block do not depend on the number of blocks.
+        fewer = integrate_sde(ode, [250.], t, 1000, seed=1, keep_paths=True,
+                              block_size=500)
+        numpy.testing.assert_array_equal(fewer.paths, result.paths[:1000])
+
+    def test_sde_solver(self):
+        ode = EpidemicODE(sigma=0.5)
+        solver = ODESolver(ode=ode, initial_state=[250.], t_high=2.0,
+                           integrator='milstein', num_paths=200,
+                           cache_size=2)
+        solution = solver.solution
+        self.assertEqual(solver.bands.shape, (1001, 5, 1))
+        self.assertTrue(solver.bands[-1, 0, 0] < solution[-1, 0] <
+                        solver.bands[-1, -1, 0])
+        bands = solver.bands
+        solver.integrator = 'odeint'
+        solver.solution
+        self.assertEqual(solver.bands.size, 0)
+        solver.integrator = 'milstein'
+        solver.solution
+        self.assertEqual(solver.cache_hits, 1)
+        numpy.testing.assert_array_equal(solver.bands, bands)
+        solver.seed = 1
+        solver.solution
+        self.assertFalse(numpy.array_equal(solver.bands, bands))
+
+
+class TestFitParameters(unittest.TestCase):
+    def setUp(self):
+        self.ode = EpidemicODE()
+        self.t = numpy.linspace(1, 10, 30)
+        true = EpidemicODE(k=4e-5, L=2e5)
+        self.data = odeint(true.eval, [250.], numpy.r_[0, self.t])[1:]
+
+    def test_fit(self):
+        result = fit_parameters(self.ode, self.t, self.data, ['k', 'L'],
+                                [250.], t0=0.0)
+        self.assertAlmostEqual(result.values['k']/4e-5, 1, places=5)
+        self.assertAlmostEqual(result.values['L']/2e5, 1, places=5)
+        self.assertEqual(self.ode.k, 3e-5)
+        history = result.starts[0]['history']
+        self.assertEqual(len(history), result.starts[0]['nfev'])
+
+    def test_multi_start(self):
+        result = fit_parameters(self.ode, self.t, self.data, ['k'], [250.],
+                                t0=0.0, bounds={'k': (1e-6, 1e-4)},
+                                num_starts=3, processes=False, seed=0)
+        self.assertEqual(len(result.starts), 3)
+        self.assertEqual(result.cost, min(start['cost'] for start in result.starts))
+
+
+class TestExpressionODE(unittest.TestCase):
+    def test_generic(self):
+        ode = GenericODE()
+        ode.num_vars = 2
+        ode.equations = ['-x1 + sin(t)', 'x0*exp(-x1)']
+        dX = ode.eval(numpy.array([1., 2.]), 0.5)
+        numpy.testing.assert_allclose(dX, [-2 + numpy.sin(0.5),
+                                           numpy.exp(-2.)])
+        batch = ode.eval_batch(numpy.ones((4, 2)), 0.0)
+        self.assertEqual(batch.shape, (4, 2))
+        ode.num_vars = 3
+        self.assertEqual(ode.vars, ['x0', 'x1', 'x2'])
+        ode.num_vars = 1
+        self.assertEqual(ode.equations, ['-x1 + sin(t)'])
+
+    def test_equation_edit(self):
+        for ode, edit in [(ODE1D(), lambda ode: setattr(ode, 'equation', '-x')),
+                          (ODE2D(), lambda ode: ode.equations.__setitem__(0, '-x')),
+                          (ODE3D(), lambda ode: ode.equations.__setitem__(0, '-x'))]:
+            solver = ODESolver(ode=ode, t_num=100)
+            before = solver.solution
+            edit(ode)
+            self.assertFalse(numpy.array_equal(solver.solution, before))
+            numpy.testing.assert_allclose(solver.solution[:, 0],
+                                          before[0, 0]*numpy.exp(-solver.t),
+                                          rtol=1e-5, atol=1e-8)
+
+    def test_sparse_jacobian(self):
+        n = 50
+        ode = GenericODE()
+        ode.num_vars = n
+        ode.equations = ['100*(%s - 2*x%d + %s)'
+                         % ('x%d' % (i-1) if i > 0 else '0', i,
+                            'x%d' % (i+1) if i < n-1 else '0')
+                         for i in range(n)]
+        sparsity = ode.jacobian_sparsity()
+        self.assertEqual(sparsity.nnz, 3*n - 2)
+        numpy.testing.assert_array_equal(sparsity.toarray(),
+                                         ode.jacobian(numpy.ones(n), 0) != 0)
+        initial_state = list(numpy.sin(numpy.linspace(0, 3, n)))
+        dense = ODESolver(ode=ode, initial_state=initial_state, t_high=1,
+                          t_num=20)
+        sparse = ODESolver(ode=ode, initial_state=initial_state, t_high=1,
+                           t_num=20, integrator='BDF')
+        numpy.testing.assert_allclose(sparse.solution, dense.solution,
+                                      rtol=1e-5, atol=1e-6)
+        self.assertEqual(sparse.method, 'bdf')
+
+    def test_blocks(self):
+        n = 20
+        ode = GenericODE()
+        ode.num_vars = 1
+        ode.equations = ['-x0']
+        ode.blocks = [StateBlock(name='u', size=n, boundary='periodic',
+                                 equation='u[i-1] - 2*u[i] + u[i+1] + x0*i')]
+        self.assertEqual(ode.vars[:3], ['x0', 'u[0]', 'u[1]'])
+        X = numpy.random.default_rng(0).random(n + 1)
+        u = X[1:]
+        numpy.testing.assert_allclose(ode.eval(X, 0),
+                numpy.r_[-X[0], numpy.roll(u, 1) - 2*u + numpy.roll(u, -1) +
+                                X[0]*numpy.arange(n)])
+        sparsity = ode.jacobian_sparsity()
+        self.assertEqual(sparsity.nnz, 1 + 4*n)
+        self.assertFalse(((ode.jacobian(X, 0) != 0) &
+                          ~sparsity.toarray()).any())
+        solver = ODESolver(ode=ode, t_high=1, t_num=10)
+        self.assertEqual(len(solver.initial_state), n + 1)
+        self.assertEqual(len(solver.column('u[3]')), 11)
+        ode.blocks[0].equation = 'u[i] - v[i]'
+        self.assertRaises(ExpressionError, ode.eval_batch, X, 0)
+
+    def test_preview_budget(self):
+        ode = GenericODE()
+        ode.num_vars = 1
+        ode.equations = ['-x0']
+        ode.blocks = [StateBlock(name='u', size=100, boundary='periodic',
+                equation='1000*(u[i-1] - 2*u[i] + u[i+1]) + sin(t*i)')]
+        solver = ODESolver(ode=ode, t_high=10, t_num=100, progressive=True,
+                           preview_budget=0.05)
+        preview = solver.solution
+        self.assertLess(solver.preview_time, 0.1)
+        # Cut off after whole segments, on the preview grid.
+        self.assertLess(len(preview), 201)
+        self.assertEqual((len(preview) - 1) % solver.PREVIEW_SEGMENT, 0)
+        numpy.testing.assert_array_equal(solver.t_solution,
+                numpy.linspace(0, 10, 201)[:len(preview)])
+        solver.wait_refined()
+        self.assertEqual(len(solver.solution), 101)
+
+    def test_fixed_size(self):
+        numpy.testing.assert_allclose(ODE1D().eval([2.], 0), [-1])
+        numpy.testing.assert_allclose(ODE2D().eval([1., 2.], 0), [-2, 1])
+        numpy.testing.assert_allclose(ODE3D().eval([1., 2., 3.], 0),
+                                      [-2, 1, 1])
+
+    def test_blow_up(self):
+        # odeint gives up before the end; the partial solution is kept.
+        solver = ODESolver(ode=ODE1D(equation='x**2'), initial_state=[1.],
+                           t_high=2.)
+        self.assertEqual(solver.solution.shape, (1001, 1))
+        self.assertTrue(solver.method.startswith('adams'))
+        self.assertTrue(solver.ode.error)
+        # The solution is 1/(1 - t), up to t = 1.
+        solved = numpy.isfinite(solver.solution[:, 0])
+        num = solved.sum()
+        self.assertTrue(solved[:num].all())
+        self.assertTrue(0.99 < solver.t[num-1] < 1.0)
+        numpy.testing.assert_allclose(solver.solution[1:num//2, 0],
+                                      1/(1 - solver.t[1:num//2]), rtol=1e-6)
+        solver.integrator = 'BDF'
+        self.assertEqual(numpy.isfinite(solver.solution[:, 0]).sum(), num)
+        self.assertTrue(solver.ode.error)
+        solver.ode.equation = '-x'
+        self.assertTrue(numpy.isfinite(solver.solution).all())
+        self.assertFalse(solver.ode.error)
+
+    def test_invalid(self):
+        ode = ODE2D()
+        for equation in ['__import__("os")', 'x.__class__', 'q + x',
+                         'open("f")', '"x"', 'x[0]', '(lambda: 1)()']:
+            ode.equations = [equation, 'x']
+            self.assertRaises(ExpressionError, ode.eval, [1., 2.], 0)
+        ode.equations = ['x + 9**9**9', 'x']
+        self.assertRaises(OverflowError, ode.eval, [1., 2.], 0)
+        ode = GenericODE()
+        ode.equations = ['__import__("os")']
+        ode.eval(numpy.array([1.]), 0)
+        self.assertTrue(ode.error)
+
+
+class TestODEEnsemble(unittest.TestCase):
+    def setUp(self):
+        self.solver = ODESolver(ode=LorenzEquation())
+        self.solver.initial_state = [10.,50.,50.]
+        self.ensemble = ODEEnsemble(solver=self.solver)
+
+    def test_solutions(self):
+        self.ensemble.initial_states = [[10.,50.,50.], [10.,50.,50.]]
+        solutions = self.ensemble.solutions
+        self.assertEqual(solutions.shape, (2, len(self.solver.t), 3))
+        numpy.testing.assert_allclose(solutions[1], self.solver.solution)
+
+    def test_perturb(self):
+        self.ensemble.perturb(5, scale=0.1, seed=0)
+        self.assertEqual(self.ensemble.initial_states.shape, (5, 3))
+        self.assertEqual(self.ensemble.solutions.shape[0], 5)
+
+    def test_thread_backend(self):
+        self.ensemble.perturb(5, scale=0.1, seed=0)
+        for method in ['odeint', 'rk4']:
+            self.ensemble.trait_set(method=method, backend='serial')
+            serial = self.ensemble.solutions
+            self.ensemble.trait_set(backend='thread', workers=2)
+            numpy.testing.assert_array_equal(self.ensemble.solutions, serial)
+
+
+class TestIntegrateFixed(unittest.TestCase):
+    def setUp(self):
+        self.ode = LorenzEquation()
+        self.states = [[10.,50.,50.], [1.,1.,1.]]
+        self.t = numpy.linspace(0, 1, 1001)
+
+    def test_rk4(self):
+        out = integrate_fixed(self.ode, self.states, self.t, chunk_size=100)
+        self.assertEqual(out.shape, (1, 2, 1001, 3))
+        solver = ODESolver(ode=self.ode, initial_state=self.states[0],
+                           t=self.t)
+        numpy.testing.assert_allclose(out[0, 0], solver.solution,
+                                      rtol=1e-4, atol=1e-4)
+
+    def test_params(self):
+        out = integrate_fixed(self.ode, self.states, self.t,
+                              params={'r': [28., 20.]})
+        self.ode.r = 20.
+        single = integrate_fixed(self.ode, self.states, self.t)
+        numpy.testing.assert_allclose(out[1], single[0])
+
+    def test_reduce(self):
+        params = {'r': [28., 20.], 'b': [2., 3.]}
+        out = integrate_fixed(self.ode, self.states, self.t, params)
+        final = integrate_fixed(self.ode, self.states, self.t, params,
+                                reduce='final')
+        numpy.testing.assert_allclose(final, out[:, :, -1])
+        t = numpy.linspace(0.5, 2.5, 2001)
+        out = integrate_fixed(self.ode, self.states, t, params)
+        mean = integrate_fixed(self.ode, self.states, t, params,
+                               reduce='mean')
+        numpy.testing.assert_allclose(mean,
+                                      numpy.trapezoid(out, t, axis=2)/2.0)
+
+    def test_threaded(self):
+        params = {'r': [28., 20.]}
+        numpy.testing.assert_array_equal(
+            integrate_threaded(self.ode, self.states, self.t, params, workers=2),
+            integrate_fixed(self.ode, self.states, self.t, params))
+        times = benchmark_threaded(self.ode, self.states, self.t[:11],
+                                   workers=2, repeat=1)
+        self.assertEqual(len(times), 2)
+        self.assertTrue(all(time > 0 for time in times))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from importlib.util import find_spec
+from unittest import mock
+
+import numpy
+
+import render
+from ode import LorenzEquation, ODESolver
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class StubPipeline(object):
+    """ Records what it is asked to draw instead of drawing it. """
+    created = []
+
+    def __init__(self, size, *columns):
+        self.size = size
+        self.drawn = []
+        StubPipeline.created.append(self)
+
+    def render(self, filename, *columns):
+        self.drawn.append((filename, [len(column) for column in columns]))
+
+
+class TestScheduling(unittest.TestCase):
+    def setUp(self):
+        StubPipeline.created = []
+        render.PIPELINES['stub'] = StubPipeline
+        self.addCleanup(render.PIPELINES.pop, 'stub')
+        self.addCleanup(setattr, render, '_pipeline', None)
+        self.environ = mock.patch.dict(os.environ)
+        self.environ.start()
+        self.addCleanup(self.environ.stop)
+
+    def test_frame_tasks(self):
+        tasks = render._frame_tasks('out', 101, 5, 'frame')
+        self.assertEqual([filename for filename, end in tasks],
+                         [os.path.join('out', 'frame_%05d.png' % i)
+                          for i in range(5)])
+        self.assertEqual([end for filename, end in tasks],
+                         [2, 26, 51, 76, 101])
+
+    def test_frames(self):
+        columns = [numpy.arange(11.), numpy.arange(11.)**2]
+        render._init_worker('stub', (40, 30), columns)
+        tasks = render._frame_tasks('out', 11, 4, 'frame')
+        filenames = list(map(render._render_frame, tasks))
+        self.assertEqual(filenames, [filename for filename, end in tasks])
+        # One pipeline per worker, redrawn for every frame.
+        self.assertEqual(len(StubPipeline.created), 1)
+        pipeline = StubPipeline.created[0]
+        self.assertEqual(pipeline.size, (40, 30))
+        self.assertEqual(pipeline.drawn,
+                         [(filename, [end, end]) for filename, end in tasks])
+
+    def test_thumbnails(self):
+        render._init_worker('stub', (20, 20), None)
+        tasks = [('a.png', [numpy.zeros(3)]*2), ('b.png', [numpy.zeros(5)]*2)]
+        self.assertEqual(list(map(render._render_columns, tasks)),
+                         ['a.png', 'b.png'])
+        self.assertEqual(len(StubPipeline.created), 1)
+        self.assertEqual(StubPipeline.created[0].drawn,
+                         [('a.png', [3, 3]), ('b.png', [5, 5])])
+
+    def test_unknown_kind(self):
+        solver = ODESolver(ode=LorenzEquation(), initial_state=[10.,50.,50.])
+        self.assertRaises(ValueError, render.render_frames, solver, 'out',
+                          kind='4d')
+
+
+class TestRender(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.solvers = [ODESolver(ode=LorenzEquation(r=r),
+                                  initial_state=[10.,50.,50.], t_num=50)
+                        for r in (20., 28.)]
+
+    def check_images(self, filenames, prefix, num):
+        self.assertEqual(filenames,
+                         [os.path.join(self.directory, '%s_%05d.png' % (prefix, i))
+                          for i in range(num)])
+        for filename in filenames:
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(8), PNG_SIGNATURE)
+
+    def render(self, kind):
+        self.check_images(render.render_frames(self.solvers[0], self.directory,
+                                               kind=kind, num_frames=3,
+                                               workers=2),
+                          'frame', 3)
+        self.check_images(render.render_thumbnails(self.solvers, self.directory,
+                                                   kind=kind, workers=1),
+                          'thumb', 2)
+
+    @unittest.skipIf(find_spec('mayavi') is None, 'needs Mayavi')
+    def test_3d(self):
+        self.render('3d')
+
+    @unittest.skipIf(find_spec('chaco') is None, 'needs Chaco')
+    def test_2d(self):
+        self.render('2d')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+
+import unittest
+import urllib.error
+
+import numpy
+
+from ode import LorenzEquation, GenericODE, ODESolver, StateBlock
+from export import solution_metadata
+from server import SolveServer, solver_from_spec
+
+
+class TestSolveServer(unittest.TestCase):
+    def setUp(self):
+        self.server = SolveServer(port=0, workers=2, processes=False)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def test_remote_solve(self):
+        ode = LorenzEquation(r=20.)
+        local = ODESolver(ode=ode, initial_state=[10.,50.,50.])
+        remote = ODESolver(ode=ode, initial_state=[10.,50.,50.],
+                           backend='remote', server_url=self.server.url)
+        numpy.testing.assert_array_equal(remote.solution, local.solution)
+        numpy.testing.assert_array_equal(remote.column('time'), local.t)
+        remote.sensitivity_params = ['r']
+        self.assertRaises(ValueError, remote.solve)
+
+    def test_generic_ode(self):
+        ode = GenericODE()
+        ode.num_vars = 2
+        ode.equations = ['x1', '-x0']
+        remote = ODESolver(ode=ode, initial_state=[1., 0.], t_mode='adaptive',
+                           backend='remote', server_url=self.server.url)
+        numpy.testing.assert_allclose(remote.column('x0'),
+                                      numpy.cos(remote.column('time')),
+                                      atol=1e-6)
+
+    def test_blocks(self):
+        ode = GenericODE()
+        ode.num_vars = 0
+        ode.blocks = [StateBlock(name='u', size=50)]
+        local = ODESolver(ode=ode, t_num=20)
+        remote = ODESolver(ode=ode, t_num=20, backend='remote',
+                           server_url=self.server.url)
+        numpy.testing.assert_array_equal(remote.solution, local.solution)
+
+    def test_deduplicate(self):
+        # Long enough for the second request to arrive while in flight.
+        spec = solution_metadata(ODESolver(ode=LorenzEquation(), t_num=100000,
+                                           initial_state=[1., 1., 1.]))
+        first = self.server.submit(spec)
+        self.assertIs(self.server.submit(spec), first)
+        first.result()
+        cached = self.server.submit(dict(spec))
+        self.assertIsNot(cached, first)
+        numpy.testing.assert_array_equal(cached.result()[1], first.result()[1])
+
+    def test_invalid(self):
+        spec = solution_metadata(ODESolver(ode=LorenzEquation(),
+                                           initial_state=[1., 1., 1.]))
+        for i in range(20):
+            self.assertRaises(KeyError, self.server.submit(
+                    dict(spec, ode_class='NopeN')).result)
+        spec['parameters']['name'] = 'x'
+        self.assertRaises(ValueError, self.server.submit(spec).result)
+        del spec['parameters']['name']
+        spec['t_num'] = 10**6 + 1
+        self.assertRaises(ValueError, self.server.submit, spec)
+        spec.update(t_num=1000, integrator='milstein', num_paths=10**4)
+        self.assertRaises(ValueError, self.server.submit, spec)
+
+    def test_too_large(self):
+        ode = GenericODE()
+        ode.num_vars = 0
+        ode.blocks = [StateBlock(name='u', size=20)]
+        spec = solution_metadata(ODESolver(ode=ode, t_num=10**5))
+        self.server.max_values = 10**6
+        self.assertRaises(ValueError, self.server.submit, spec)
+        self.server.max_vars = 10
+        spec['t_num'] = 10
+        self.assertRaises(ValueError, self.server.submit, spec)
+        self.assertRaises(ValueError, solver_from_spec, spec, max_vars=10)
+        # A block's size is checked before its variables are made.
+        spec['blocks'][0]['size'] = 10**9
+        self.assertRaises(ValueError, solver_from_spec, spec)
+        solver = ODESolver(ode=LorenzEquation(), initial_state=[1., 1., 1.],
+                           t_num=10**6 + 1, backend='remote',
+                           server_url=self.server.url)
+        self.assertRaises(urllib.error.HTTPError, solver.solve)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+
+import os
+import subprocess
+import sys
+import unittest
+
+# Seconds allowed for `import view` and creating an ODEApp in a fresh
+# interpreter.
+STARTUP_BUDGET = 2.0
+
+HEAVY_MODULES = ('chaco', 'enable', 'mayavi', 'tvtk', 'vtk')
+
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import view
+app = view.ODEApp()
+app.solver
+print(time.perf_counter() - start)
+print(' '.join(sorted(set(name.split('.')[0] for name in sys.modules))))
+"""
+
+
+class TestStartup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed, modules = output.decode().strip().splitlines()[-2:]
+        cls.elapsed = float(elapsed)
+        cls.modules = modules.split()
+
+    def test_no_plot_imports(self):
+        for name in HEAVY_MODULES:
+            self.assertFalse(name in self.modules, name)
+
+    def test_startup_budget(self):
+        self.assertTrue(self.elapsed < STARTUP_BUDGET,
+                        'startup took %.2fs' % self.elapsed)
+
+if __name__ == '__main__':
+    unittest.main()
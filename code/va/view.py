@@ -1,17 +1,20 @@
 
-from traits.api import HasTraits, Instance, DelegatesTo, List
+from traits.api import HasTraits, Instance, DelegatesTo, List, Button
 from traitsui.api import View, Item, HSplit, VSplit, Tabbed, Group, InstanceEditor
 
 from ode import ODE, ODESolver, GenericODE, LorenzEquation, EpidemicODE, ODE1D, ODE2D, ODE3D
-from plot2d import ODEPlot
-from plot3d import ODEPlot3D
+
+# The plot modules pull in chaco/enable and mayavi/VTK, which dominate the
+# startup time, so they are only imported when a plot is first created.
 
 class ODEApp(HasTraits):
     ode = DelegatesTo('solver')
     ode_list = List(Instance(ODE))
     solver = Instance(ODESolver)
-    plot = Instance(ODEPlot)
-    plot3d = Instance(ODEPlot3D)
+    plot = Instance('plot2d.ODEPlot')
+    # The 3D plot is only created once the user asks for it.
+    plot3d = Instance('plot3d.ODEPlot3D')
+    show_plot3d = Button('Show 3D plot')
 
     traits_view = View(HSplit(VSplit([Group(Item('ode', style='custom',
                                                  editor=InstanceEditor(
@@ -23,7 +26,11 @@ class ODEApp(HasTraits):
                                                 label='Solver')],
                                     ),
                               Tabbed(Item('plot', style='custom'),
-                                     Item('plot3d', style='custom'),
+                                     Group(Item('show_plot3d', show_label=False,
+                                                visible_when='plot3d is None'),
+                                           Item('plot3d', style='custom',
+                                                visible_when='plot3d is not None'),
+                                           label='3D plot'),
                                      dock='tab',
                                      show_labels=False),
                               id='example.ODEAPP.panels',
@@ -34,16 +41,34 @@ class ODEApp(HasTraits):
 
     def _ode_changed(self):
         self.plot = self._plot_default()
-        self.plot3d = self._plot3d_default()
+        if self.plot3d is not None:
+            self.plot3d = self._create_plot3d()
+
+    def _show_plot3d_fired(self):
+        self.plot3d = self._create_plot3d()
 
     def _solver_default(self):
-        return ODESolver(ode=self.ode_list[0])
+        # The plots need no more than float32.
+        return ODESolver(ode=self.ode_list[0], storage_order='F',
+                         storage_dtype='float32', progressive=True)
 
     def _plot_default(self):
+        from plot2d import ODEPlot
         return ODEPlot(solver=self.solver)
 
-    def _plot3d_default(self):
-        return ODEPlot3D(solver=self.solver)
+    def _create_plot3d(self, solver=None):
+        from plot3d import ODEPlot3D
+        return ODEPlot3D(solver=solver or self.solver)
+
+    def open_run(self, path):
+        """ Show a run stored by `export.export_solution` in the plots
+        instead of the live solution. """
+        from plot2d import ODEPlot
+        from stored import StoredSolution
+        stored = StoredSolution(path=path)
+        self.plot = ODEPlot(solver=stored)
+        if self.plot3d is not None:
+            self.plot3d = self._create_plot3d(stored)
 
     def _ode_list_default(self):
         return [LorenzEquation(), EpidemicODE(), GenericODE()]